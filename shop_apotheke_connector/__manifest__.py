@@ -3,7 +3,7 @@
 
 {
     'name': 'Shop Apotheke Connector',
-    'version': '1.0',
+    'version': '1.1',
     'summary': 'Shop Apotheke Connector',
     'website': 'https://mountain.co.at/',
     'depends': ['base', 'mail', 'sale', 'account', 'austria_dpd_shipping_integration'],
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+import logging
+
+from odoo.sql_db import db_connect
+
+_logger = logging.getLogger(__name__)
+
+# Give up on an index instead of blocking writers while waiting for a lock
+LOCK_TIMEOUT = '10s'
+
+# (table, column, kind) of the indexes declared on the connector lookup keys,
+# named like the ORM does so it finds them and does not build them again
+INDEXES = [
+    ('res_partner', 'apotheke_customer_id', 'btree_not_null'),
+    ('apotheke_product_offer', 'product_ean', 'btree_not_null'),
+    ('import_order_queue_line', 'apotheke_order_id', 'btree_not_null'),
+    ('product_template', 'ean', 'btree_not_null'),
+    ('apotheke_category', 'name', 'trigram'),
+    ('apotheke_category', 'code', 'trigram'),
+]
+
+
+def _index_statement(cr, table, column, kind):
+    index_name = f'{table}__{column}_index'
+    if kind == 'trigram':
+        cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if not cr.fetchone():
+            # Without pg_trgm the ORM falls back to a plain btree index itself
+            return index_name, None
+        return index_name, (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" '
+                            f'ON "{table}" USING gin ("{column}" gin_trgm_ops)')
+    return index_name, (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" '
+                        f'ON "{table}" ("{column}") WHERE "{column}" IS NOT NULL')
+
+
+def migrate(cr, version):
+    """
+    Build the indexes of the connector lookup keys with CREATE INDEX CONCURRENTLY,
+    so large tables stay writable during the upgrade. The statements run on a
+    separate autocommit connection, and the upgrade transaction is committed
+    first because a concurrent build waits for every older open transaction.
+    Any index that cannot be built here is created by the ORM as usual.
+    """
+    if not version:
+        return
+
+    cr.commit()
+    cnx = db_connect(cr.dbname)
+    with cnx.cursor() as index_cr:
+        index_cr._cnx.autocommit = True
+        try:
+            index_cr.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+            for table, column, kind in INDEXES:
+                index_name, statement = _index_statement(index_cr, table, column, kind)
+                if not statement:
+                    continue
+                try:
+                    index_cr.execute(statement)
+                    _logger.info("Created index %s concurrently", index_name)
+                except Exception as e:
+                    _logger.warning("Could not create index %s concurrently, "
+                                    "it will be built during the module update: %s", index_name, e)
+                    # A failed concurrent build leaves an invalid index behind
+                    index_cr.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+        finally:
+            index_cr.execute("RESET lock_timeout")
+            index_cr._cnx.autocommit = False
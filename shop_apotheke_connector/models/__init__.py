@@ -5,9 +5,13 @@ from . import product_category_inherit
 from . import product_template_inherit
 from . import delivery_carrier_inherit
 from . import stock_picking_inherit
+from . import stock_move_inherit
 from . import sale_inherit
 from . import res_partner_inherit
+from . import res_country_inherit
+from . import res_lang_inherit
 from . import setting
+from . import apotheke_api_rate_slot
 from . import shop
 from . import product
 from . import import_category_queue
@@ -18,4 +22,5 @@ from . import offer
 from . import tax
 from . import category
 from . import apotheke_import_operation_log
+from . import apotheke_image_cache
 from . import import_apotheke_cron_helper
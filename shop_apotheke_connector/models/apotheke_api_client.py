@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from odoo import sql_db
+
+_logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds applied to every Shop Apotheke call
+DEFAULT_TIMEOUT = (5, 60)
+POOL_MAXSIZE = 10
+
+# Retry policy
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RATE_LIMIT = 5.0  # requests per second per connector setting
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_AFTER_MAX = 300.0
+# Total seconds one request may spend waiting between retries before giving up
+RETRY_WAIT_MAX = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class ApothekeApiError(Exception):
+    """Raised when a Shop Apotheke call still fails after all retries."""
+
+    def __init__(self, message, response=None, partial=None):
+        super().__init__(message)
+        self.response = response
+        # Items already fetched before a paginated call failed
+        self.partial = partial or []
+
+
+class _TokenBucket(object):
+    """Thread-safe token bucket shared by the clients of one process, used for clients without a setting."""
+
+    def __init__(self, rate):
+        self.rate = max(float(rate), 0.1)
+        self.capacity = max(self.rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _SettingRateLimiter(object):
+    """
+    Rate limiter shared by every process of the database: each request reserves
+    the next free slot on the setting's ``apotheke.api.rate.slot`` row, in its
+    own transaction, and sleeps until that slot. Falls back to a process-local
+    bucket if the slot cannot be reserved.
+    """
+
+    def __init__(self, dbname, setting_id, rate):
+        self.dbname = dbname
+        self.setting_id = setting_id
+        self.rate = max(float(rate), 0.1)
+        self.fallback = _get_bucket((dbname, setting_id), rate)
+
+    def acquire(self):
+        try:
+            with sql_db.db_connect(self.dbname).cursor() as cr:
+                # Concurrent reservations wait for the row and read its new slot,
+                # they would fail with a serialization error at REPEATABLE READ
+                cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+                cr.execute("""
+                    INSERT INTO apotheke_api_rate_slot (setting_id, next_slot)
+                         VALUES (%(setting_id)s, EXTRACT(EPOCH FROM clock_timestamp()) + %(step)s)
+                    ON CONFLICT (setting_id) DO UPDATE
+                            SET next_slot = GREATEST(apotheke_api_rate_slot.next_slot,
+                                                     EXTRACT(EPOCH FROM clock_timestamp())) + %(step)s
+                      RETURNING next_slot - %(step)s - EXTRACT(EPOCH FROM clock_timestamp())
+                """, {'setting_id': self.setting_id, 'step': 1.0 / self.rate})
+                wait = cr.fetchone()[0]
+        except Exception as e:
+            _logger.warning("Could not reserve an API slot for setting %s, using the process limit: %s",
+                            self.setting_id, e)
+            self.fallback.acquire()
+            return
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _get_session(key):
+    """Return the keep-alive session stored under ``key``, creating it on first use."""
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+        return session
+
+
+def _get_bucket(key, rate):
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None or bucket.rate != max(float(rate), 0.1):
+            bucket = _TokenBucket(rate)
+            _buckets[key] = bucket
+        return bucket
+
+
+def _parse_retry_after(value):
+    """Return the delay in seconds described by a ``Retry-After`` header, or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class ApothekeApiClient(object):
+    """
+    Thin HTTP client for the Shop Apotheke (Mirakl) API.
+
+    Sessions are pooled per database, connector setting and credentials so every
+    model and wizard reuses the same TCP/TLS connections. Throttled (429) and
+    transient (5xx, network) failures are retried with exponential backoff and
+    jitter, and all clients of one setting share a token bucket so they stay
+    under the marketplace quota together. The client only holds plain values,
+    which makes it safe to use outside of the ORM (e.g. threads).
+    """
+
+    def __init__(self, server, api_key, session_key=None, limiter=None, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, rate_limit=DEFAULT_RATE_LIMIT):
+        self.server = (server or '').rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max(max_retries, 0)
+        session_key = session_key or (self.server, api_key)
+        self.session = _get_session(session_key)
+        self.limiter = limiter or _get_bucket(session_key, rate_limit or DEFAULT_RATE_LIMIT)
+
+    @classmethod
+    def from_setting(cls, setting):
+        """Build a client for a ``shop.apotheke.connector.setting`` record."""
+        setting.ensure_one()
+        dbname = setting.env.cr.dbname
+        return cls(
+            setting.server,
+            setting.api_key,
+            session_key=(dbname, setting.id, setting.server, setting.api_key),
+            limiter=_SettingRateLimiter(dbname, setting.id, setting.api_rate_limit or DEFAULT_RATE_LIMIT),
+            max_retries=setting.api_max_retries,
+        )
+
+    def _build_headers(self, headers=None, json_body=False):
+        result = {
+            'Authorization': self.api_key or '',
+            'Accept': 'application/json',
+        }
+        if json_body:
+            result['Content-Type'] = 'application/json'
+        if headers:
+            result.update(headers)
+        return result
+
+    def _backoff(self, attempt, response=None):
+        """Delay before the next attempt: ``Retry-After`` if given, else exponential with full jitter."""
+        if response is not None:
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, RETRY_AFTER_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method, path, params=None, json=None, headers=None, timeout=None):
+        """
+        Send a request to ``path`` (relative to the server URL) and return the response.
+
+        429 responses are retried for every method; 5xx responses and network errors
+        only for idempotent methods. The last response is returned once retries are
+        exhausted or once the next wait would exceed RETRY_WAIT_MAX in total, so
+        status handling is left to the caller.
+        """
+        method = method.upper()
+        url = f"{self.server}/{path.lstrip('/')}"
+        attempt = 0
+        waited = 0.0
+        while True:
+            self.limiter.acquire()
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    params=params,
+                    json=json,
+                    headers=self._build_headers(headers, json_body=json is not None),
+                    timeout=timeout or self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                if waited + delay > RETRY_WAIT_MAX:
+                    raise
+                _logger.warning("Shop Apotheke %s %s failed (%s), retrying in %.1fs", method, path, e, delay)
+            else:
+                retryable = response.status_code == 429 or (
+                    response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                if waited + delay > RETRY_WAIT_MAX:
+                    _logger.warning("Shop Apotheke %s %s returned HTTP %s, giving up instead of waiting %.1fs",
+                                    method, path, response.status_code, delay)
+                    return response
+                _logger.warning("Shop Apotheke %s %s returned HTTP %s, retrying in %.1fs",
+                                method, path, response.status_code, delay)
+            attempt += 1
+            waited += delay
+            time.sleep(delay)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def fetch_all(self, path, key, params=None, page_size=100):
+        """
+        Follow ``max``/``offset`` pagination on ``path`` and return every item found
+        under ``key``. If a page still fails after retries, an ApothekeApiError is
+        raised carrying the items fetched so far in ``partial``.
+        """
+        items = []
+        offset = 0
+        while True:
+            page_params = dict(params or {}, max=page_size, offset=offset)
+            try:
+                response = self.get(path, params=page_params)
+                response.raise_for_status()
+                page = response.json().get(key, [])
+            except Exception as e:
+                raise ApothekeApiError(str(e), response=getattr(e, 'response', None), partial=items) from e
+            if not page:
+                break
+            items.extend(page)
+            if len(page) < page_size:
+                break
+            offset += page_size
+        return items
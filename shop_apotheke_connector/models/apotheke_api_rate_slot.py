@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+from odoo import models, fields
+
+
+class ApothekeApiRateSlot(models.Model):
+    """
+    Next free API request slot of a connector setting. The row is reserved by
+    ApothekeApiClient on its own short transaction, so every worker and cron
+    process of the database shares the same request rate.
+    """
+    _name = 'apotheke.api.rate.slot'
+    _description = 'Apotheke API Rate Slot'
+    _log_access = False
+
+    setting_id = fields.Many2one('shop.apotheke.connector.setting', string='Instance',
+                                 required=True, ondelete='cascade')
+    next_slot = fields.Float(string='Next Slot', help='Epoch time from which the next request may be sent.')
+
+    _sql_constraints = [
+        ('unique_setting', 'unique(setting_id)', 'An instance can only have one rate slot.'),
+    ]
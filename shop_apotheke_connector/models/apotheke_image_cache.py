@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+from odoo import models, fields, api
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import hashlib
+import logging
+
+from .apotheke_api_client import _get_session
+from .savepoint_batch import run_in_savepoints
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of image downloads in flight at once
+IMAGE_FETCH_WORKERS = 8
+IMAGE_FETCH_TIMEOUT = (5, 30)
+
+
+def _download_image(session, url, etag=None, last_modified=None):
+    """
+    Conditional GET of one image, returns (url, status, content, etag, last_modified).
+    The status is None when the request failed. Thread-safe, no ORM access.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        response = session.get(url, headers=headers, timeout=IMAGE_FETCH_TIMEOUT)
+    except Exception as e:
+        _logger.warning("Failed to fetch image %s: %s", url, e)
+        return url, None, None, None, None
+    return (url, response.status_code, response.content if response.status_code == 200 else None,
+            response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+
+class ApothekeImageCache(models.Model):
+    _name = 'apotheke.image.cache'
+    _description = 'Apotheke Image Cache'
+    _rec_name = 'url'
+
+    url = fields.Char(string='URL', required=True, index=True)
+    etag = fields.Char(string='ETag')
+    last_modified = fields.Char(string='Last Modified')
+    checksum = fields.Char(string='Checksum')
+    image = fields.Image(string='Image', max_width=1920, max_height=1920)
+
+    _sql_constraints = [
+        ('unique_url', 'unique(url)', 'An image URL can only be cached once.'),
+    ]
+
+    @api.model
+    def _fetch_images(self, urls):
+        """
+        Download the images at ``urls`` concurrently over one pooled session and
+        return {url: base64 image}. Cached URLs are revalidated with their ETag /
+        Last-Modified, so unchanged images are not downloaded again, and the cache
+        is only rewritten when the content hash changed. Failed URLs, and the ones
+        whose content is not a valid image, are left out.
+        """
+        urls = list({url for url in urls if url})
+        if not urls:
+            return {}
+
+        cached = {cache.url: cache for cache in self.search([('url', 'in', urls)])}
+        session = _get_session(('apotheke.image.cache',))
+
+        # Network stage, no ORM access in the threads
+        with ThreadPoolExecutor(max_workers=min(IMAGE_FETCH_WORKERS, len(urls))) as executor:
+            downloads = list(executor.map(
+                lambda url: _download_image(
+                    session, url,
+                    cached[url].etag if url in cached else None,
+                    cached[url].last_modified if url in cached else None),
+                urls))
+
+        result = {}
+        to_create = []
+        for url, status, content, etag, last_modified in downloads:
+            cache = cached.get(url)
+            if status == 304 and cache and cache.image:
+                result[url] = cache.image
+            elif status == 200 and content:
+                checksum = hashlib.sha1(content).hexdigest()
+                if cache and cache.checksum == checksum and cache.image:
+                    cache.write({'etag': etag, 'last_modified': last_modified})
+                    result[url] = cache.image
+                    continue
+                vals = {
+                    'url': url,
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'checksum': checksum,
+                    'image': base64.b64encode(content),
+                }
+                if cache:
+                    try:
+                        with self.env.cr.savepoint():
+                            cache.write(vals)
+                    except Exception as e:
+                        _logger.warning("Invalid image %s: %s", url, e)
+                        continue
+                else:
+                    to_create.append(vals)
+                result[url] = vals['image']
+            elif status is not None:
+                _logger.warning("Failed to fetch image %s: HTTP %s", url, status)
+
+        # A corrupt or oversized download only drops its own image
+        _done, failed = run_in_savepoints(self.env.cr, to_create, self.create)
+        for vals, e in failed:
+            _logger.warning("Invalid image %s: %s", vals['url'], e)
+            result.pop(vals['url'], None)
+        return result
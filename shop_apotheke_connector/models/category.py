@@ -13,8 +13,8 @@ class ApothekeCategory(models.Model):
     _inherit = ['mail.thread']
     _rec_name = 'name'
 
-    code = fields.Char(string="Code", required=True)
-    name = fields.Char(string="Name", required=True)
+    code = fields.Char(string="Code", required=True, index='trigram')
+    name = fields.Char(string="Name", required=True, index='trigram')
     parent_id = fields.Many2one(
         'apotheke.category',
         string="Parent Category",
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 # Developed by Youssef Omri AKA DZEUF
 
-from odoo import models, api, _
+from odoo import models, api
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import traceback
 
 _logger = logging.getLogger(__name__)
 
+# Maximum number of shop/channel pairs whose orders are fetched in parallel
+ORDER_FETCH_WORKERS = 4
+
 class ImportApothekeCronHelper(models.TransientModel):
     _name = 'import.apotheke.cron.helper'
     _description = 'Apotheke Order Import Cron Helper'
@@ -16,11 +20,13 @@ class ImportApothekeCronHelper(models.TransientModel):
         Setting = self.env['shop.apotheke.connector.setting']
         Wizard = self.env['import.apotheke.order.wizard']
         Log = self.env['apotheke.import.operation.log']
-        OrderQueue = self.env['import.order.queue']
 
         settings = Setting.search([])
         _logger.info("Starting Apotheke cron job for %s settings", len(settings))
 
+        # Collect every (setting, shop, channel) to import, the ORM is only used here
+        # and in the serial phase below
+        jobs = []
         for setting in settings:
             if not setting.shop_ids:
                 _logger.warning("No shops found for setting ID %s", setting.id)
@@ -32,80 +38,64 @@ class ImportApothekeCronHelper(models.TransientModel):
                     continue
 
                 for channel in shop.channel_ids:
+                    wizard = Wizard.create({
+                        'setting_id': setting.id,
+                        'shop_id': shop.id,
+                        'channel_id': channel.id,
+                        'change_state_on_apotheke': True,
+                    })
+                    jobs.append((setting, shop, channel, wizard, wizard._prepare_order_fetch()))
+
+        # Network phase: fetch the pages of all shop/channel pairs concurrently
+        results = {}
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(ORDER_FETCH_WORKERS, len(jobs))) as executor:
+                futures = {
+                    executor.submit(Wizard._fetch_orders, client, params): index
+                    for index, (_setting, _shop, _channel, _wizard, (client, params)) in enumerate(jobs)
+                }
+                for future in as_completed(futures):
                     try:
-                        _logger.info("Processing instance %s | shop %s | channel %s",
-                                     setting.display_name, shop.name, channel.label)
-
-                        wizard = Wizard.create({
-                            'setting_id': setting.id,
-                            'shop_id': shop.id,
-                            'channel_id': channel.id,
-                            'change_state_on_apotheke': True,
-                        })
-                        wizard_result = wizard.action_import_orders()
-
-                        # Safely parse domain to get number of imported orders
-                        imported_order_ids = []
-                        if wizard_result:
-                            domain = wizard_result.get('domain')
-                            if isinstance(domain, list) and len(domain) > 1:
-                                domain_filter = domain[1]
-                                if isinstance(domain_filter, (list, tuple)) and len(domain_filter) > 2:
-                                    imported_order_ids = domain_filter[2]
-
-                        imported_count = len(imported_order_ids)
-
-                        Log.create({
-                            'setting_id': setting.id,
-                            'shop_id': shop.id,
-                            'channel_id': channel.id,
-                            'state': 'success',
-                            'imported_order_count': imported_count,
-                        })
-
-                        _logger.info("Successfully imported %s orders", imported_count)
-
-                    except Exception as e:
-                        error_trace = traceback.format_exc()
-                        _logger.error("Failed to import orders for setting %s | shop %s | channel %s\n%s",
-                                      setting.display_name, shop.name, channel.label, error_trace)
-
-                        Log.create({
-                            'setting_id': setting.id,
-                            'shop_id': shop.id,
-                            'channel_id': channel.id,
-                            'state': 'failed',
-                            'error_message': error_trace,
-                        })
-
-        # Now process all 'draft' order queues
-        draft_queues = OrderQueue.search([('state', '=', 'draft')])
-        _logger.info("Processing %s draft order queues", len(draft_queues))
-
-        for queue in draft_queues:
-            try:
-                _logger.info("Creating orders for queue %s", queue.name)
-                queue.action_create_orders()
-
-                Log.create({
-                    'setting_id': queue.setting_id.id,
-                    'shop_id': queue.shop_id.id,
-                    'channel_id': queue.channel_id.id,
-                    'state': 'success',
-                    'note': _('Processed order queue: %s') % queue.name,
-                })
-
-                _logger.info("Successfully processed queue %s", queue.name)
-
-            except Exception as e:
-                error_trace = traceback.format_exc()
-                _logger.error("Failed to process order queue %s\n%s", queue.name, error_trace)
-
-                Log.create({
-                    'setting_id': queue.setting_id.id,
-                    'shop_id': queue.shop_id.id,
-                    'channel_id': queue.channel_id.id,
-                    'state': 'failed',
-                    'note': _('Failed to process queue %s') % queue.name,
-                    'error_message': error_trace,
-                })
+                        results[futures[future]] = (future.result(), None)
+                    except Exception:
+                        results[futures[future]] = (None, traceback.format_exc())
+
+        # ORM phase: queue the fetched orders one pair at a time on the cron cursor
+        for index, (setting, shop, channel, wizard, _fetch) in enumerate(jobs):
+            fetched, error_trace = results[index]
+            _logger.info("Processing instance %s | shop %s | channel %s",
+                         setting.display_name, shop.name, channel.label)
+
+            if not error_trace:
+                try:
+                    with self.env.cr.savepoint():
+                        queue = wizard._import_fetched_orders(*fetched)
+                    imported_count = len(queue.line_ids) if queue else 0
+
+                    Log.create({
+                        'setting_id': setting.id,
+                        'shop_id': shop.id,
+                        'channel_id': channel.id,
+                        'state': 'success',
+                        'imported_order_count': imported_count,
+                    })
+
+                    _logger.info("Successfully imported %s orders", imported_count)
+                    continue
+                except Exception:
+                    error_trace = traceback.format_exc()
+
+            _logger.error("Failed to import orders for setting %s | shop %s | channel %s\n%s",
+                          setting.display_name, shop.name, channel.label, error_trace)
+
+            Log.create({
+                'setting_id': setting.id,
+                'shop_id': shop.id,
+                'channel_id': channel.id,
+                'state': 'failed',
+                'error_message': error_trace,
+            })
+
+        # Sale orders are created by the order workers, wake them up for the new
+        # lines and for the ones left pending by a previous run
+        self.env['import.order.queue.line']._trigger_order_workers()
@@ -2,10 +2,16 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, api, _
+from odoo.tools import split_every
 import logging
 
+from .savepoint_batch import run_in_savepoints
+
 _logger = logging.getLogger(__name__)
 
+# Number of offers created per create() call and written per savepoint
+OFFER_BATCH_SIZE = 500
+
 
 class ImportOfferQueue(models.Model):
     _name = 'import.offer.queue'
@@ -49,63 +55,114 @@ class ImportOfferQueue(models.Model):
             'message': message,
         })
 
+    def _prepare_offer_vals(self, line):
+        return {
+            'shop_id': line.shop_id.id,
+            'offer_sku': line.offer_sku or '',
+            'offer_active': line.offer_active,
+            'shop_offer_id': line.shop_offer_id,
+            'product_id': line.product_id.id,
+            'product_sku': line.product_sku,
+            'product_ean': line.product_ean,
+            'price': line.price,
+            'quantity': line.quantity,
+            'state_code': line.state_code or '',
+            'start_date': line.start_date,
+            'end_date': line.end_date,
+            'channel_ids': [(6, 0, line.channel_ids.ids)],
+        }
+
+    def _upsert_offers(self, lines):
+        """
+        Create or update the offers of ``lines``, matched on (shop_offer_id, shop_id).
+        Existing offers of the queue's shops are loaded in one query, new offers are
+        created in batches of OFFER_BATCH_SIZE and updated offers written without any
+        lookup. A failing batch is replayed record by record so a bad line only fails
+        itself. Line states and logs are written in bulk.
+
+        :return: (processed count, failed count)
+        """
+        self.ensure_one()
+        # The offers mirror the marketplace, they must not be pushed back
+        OfferModel = self.env['apotheke.product.offer'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_notrack=True, apotheke_sync_origin='inbound')
+        log_vals = []
+        processed_lines = self.env['import.offer.queue.line']
+        failed_lines = self.env['import.offer.queue.line']
+
+        def _log(status, message):
+            log_vals.append({'queue_id': self.id, 'status': status, 'message': message})
+
+        def _product_name(line):
+            return line.product_id.name if line.product_id else 'Unknown Product'
+
+        missing = lines.filtered(lambda l: not l.product_id)
+        for line in missing:
+            _log('error', f"[{_product_name(line)}] No related Apotheke Product found.")
+        failed_lines |= missing
+        lines -= missing
+
+        # Check for existing offers by shop_offer_id + shop_id
+        existing = {}
+        if lines:
+            for offer in OfferModel.search_read([
+                ('shop_offer_id', 'in', list(set(lines.mapped('shop_offer_id')))),
+                ('shop_id', 'in', lines.shop_id.ids),
+            ], ['shop_offer_id', 'shop_id'], order='id'):
+                existing.setdefault((offer['shop_offer_id'], offer['shop_id'][0]), offer['id'])
+
+        to_create = {}
+        to_write = []
+        for line in lines:
+            key = (line.shop_offer_id, line.shop_id.id)
+            if key in existing:
+                to_write.append((line, existing[key]))
+            elif key in to_create:
+                # Same offer twice in the queue: the last line wins, like a create followed by a write
+                to_create[key][0] |= line
+                to_create[key][1] = self._prepare_offer_vals(line)
+            else:
+                to_create[key] = [line, self._prepare_offer_vals(line)]
+
+        def _handle_error(batch_lines, error):
+            _logger.warning("Offer upsert failed for lines %s: %s", batch_lines.ids, error)
+            for line in batch_lines:
+                _log('error', f"[Line {line.id}] Error: {str(error)}")
+            return batch_lines
+
+        def _write_offers(items):
+            for line, offer_id in items:
+                OfferModel.browse(offer_id).write(self._prepare_offer_vals(line))
+            return items
+
+        for batch in split_every(OFFER_BATCH_SIZE, list(to_create.values())):
+            done, failed = run_in_savepoints(
+                self.env.cr, batch, lambda items: OfferModel.create([vals for _lines, vals in items]))
+            for (batch_lines, _vals), e in failed:
+                failed_lines |= _handle_error(batch_lines, e)
+            for (batch_lines, _vals), _offer in done:
+                processed_lines |= batch_lines
+                for line in batch_lines:
+                    _log('success', f"[{_product_name(line)}] Created new offer.")
+
+        for batch in split_every(OFFER_BATCH_SIZE, to_write):
+            done, failed = run_in_savepoints(self.env.cr, batch, _write_offers)
+            for (line, _offer_id), e in failed:
+                failed_lines |= _handle_error(line, e)
+            for (line, offer_id), _result in done:
+                processed_lines |= line
+                _log('success', f"[{_product_name(line)}] Updated existing offer ID {offer_id}.")
+
+        processed_lines.write({'state': 'processed'})
+        failed_lines.write({'state': 'failed'})
+        for batch in split_every(OFFER_BATCH_SIZE, log_vals):
+            self.env['import.offer.queue.log'].create(list(batch))
+        return len(processed_lines), len(failed_lines)
+
     def action_update_apotheke_products(self):
         """Create or update Apotheke product offers from queue lines."""
-        OfferModel = self.env['apotheke.product.offer']
-
         total = len(self.line_ids.filtered(lambda l: l.state == 'draft'))
-        proceeded = 0
-        failed = 0
-
-        for line in self.line_ids:
-            if line.state == 'processed':
-                continue
-            product_name = line.product_id.name if line.product_id else 'Unknown Product'
-            try:
-                if not line.product_id:
-                    line.state = 'failed'
-                    self._create_log('error', f"[{product_name}] No related Apotheke Product found.")
-                    failed += 1
-                    continue
-
-                vals = {
-                    'shop_id': line.shop_id.id,
-                    'offer_sku': line.offer_sku or '',
-                    'offer_active': line.offer_active,
-                    'shop_offer_id': line.shop_offer_id,
-                    'product_id': line.product_id.id,
-                    'product_sku': line.product_sku,
-                    'product_ean': line.product_ean,
-                    'price': line.price,
-                    'quantity': line.quantity,
-                    'state_code': line.state_code or '',
-                    'start_date': line.start_date,
-                    'end_date': line.end_date,
-                    'channel_ids': [(6, 0, line.channel_ids.ids)],
-                }
-
-                # Check for existing offer by shop_offer_id + shop_id
-                existing = OfferModel.search([
-                    ('shop_offer_id', '=', line.shop_offer_id),
-                    ('shop_id', '=', line.shop_id.id)
-                ], limit=1)
-
-                if existing:
-                    existing.write(vals)
-                    self._create_log('success', f"[{product_name}] Updated existing offer ID {existing.id}.")
-                else:
-                    OfferModel.create(vals)
-                    self._create_log('success', f"[{product_name}] Created new offer.")
-
-                line.state = 'processed'
-                proceeded += 1
-
-            except Exception as e:
-                line.state = 'failed'
-                failed += 1
-                error_message = f"[Line {line.id}] Error: {str(e)}"
-                self._create_log('error', error_message)
-                _logger.exception(error_message)
+        proceeded, failed = self._upsert_offers(self.line_ids.filtered(lambda l: l.state != 'processed'))
 
         # Update queue state
         if (proceeded == total and total > 0) or all(l.state == 'processed' for l in self.line_ids):
@@ -132,59 +189,8 @@ class ImportOfferQueue(models.Model):
 
     def create_offers(self):
         """Create or update offers from draft queue lines and set offer_created flag."""
-        OfferModel = self.env['apotheke.product.offer']
-
         total = len(self.line_ids.filtered(lambda l: l.state == 'draft'))
-        proceeded = 0
-        failed = 0
-
-        for line in self.line_ids:
-            product_name = line.product_id.name if line.product_id else 'Unknown Product'
-            try:
-                if not line.product_id:
-                    line.state = 'failed'
-                    self._create_log('error', f"[{product_name}] No related Apotheke Product found.")
-                    failed += 1
-                    continue
-
-                vals = {
-                    'shop_id': line.shop_id.id,
-                    'offer_sku': line.offer_sku or '',
-                    'offer_active': line.offer_active,
-                    'shop_offer_id': line.shop_offer_id,
-                    'product_id': line.product_id.id,
-                    'product_sku': line.product_sku,
-                    'product_ean': line.product_ean,
-                    'price': line.price,
-                    'quantity': line.quantity,
-                    'state_code': line.state_code or '',
-                    'start_date': line.start_date,
-                    'end_date': line.end_date,
-                    'channel_ids': [(6, 0, line.channel_ids.ids)],
-                }
-
-                # Check for existing offer by shop_offer_id + shop_id
-                existing = OfferModel.search([
-                    ('shop_offer_id', '=', line.shop_offer_id),
-                    ('shop_id', '=', line.shop_id.id)
-                ], limit=1)
-
-                if existing:
-                    existing.write(vals)
-                    self._create_log('success', f"[{product_name}] Updated existing offer ID {existing.id}.")
-                else:
-                    OfferModel.create(vals)
-                    self._create_log('success', f"[{product_name}] Created new offer.")
-
-                line.state = 'processed'
-                proceeded += 1
-
-            except Exception as e:
-                line.state = 'failed'
-                failed += 1
-                error_message = f"[Line {line.id}] Error: {str(e)}"
-                self._create_log('error', error_message)
-                _logger.exception(error_message)
+        proceeded, failed = self._upsert_offers(self.line_ids)
 
         # Update queue state
         if (proceeded == total and total > 0) or all(l.state == 'processed' for l in self.line_ids):
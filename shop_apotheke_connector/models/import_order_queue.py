@@ -1,5 +1,45 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+import base64
+import json
+import logging
+import time
+import traceback
+import zlib
+from collections import Counter, defaultdict
+
+import psycopg2
+
+_logger = logging.getLogger(__name__)
+
+# Order worker crons sharing the order creation jobs
+ORDER_WORKER_CRONS = (
+    'shop_apotheke_connector.ir_cron_apotheke_order_worker_1',
+    'shop_apotheke_connector.ir_cron_apotheke_order_worker_2',
+    'shop_apotheke_connector.ir_cron_apotheke_order_worker_3',
+)
+# A job failing this many times is given up and its line marked as failed
+ORDER_JOB_MAX_ATTEMPTS = 3
+# Seconds a worker keeps claiming new chunks before leaving the cron thread, kept
+# below the default real time limit of a cron (120s)
+ORDER_JOB_TIME_LIMIT = 90
+# Times a checkpoint is replayed when another worker checkpointed the same queue first
+CHECKPOINT_MAX_TRIES = 5
+
+
+def _aggregate_state(counts):
+    """Global state of a record from the {state: count} of its children."""
+    total = sum(counts.values())
+    if not total:
+        return 'draft'
+    if counts.get('processed', 0) == total:
+        return 'processed'
+    if counts.get('failed', 0) == total:
+        return 'failed'
+    if any(counts.get(state) for state in ('processed', 'failed', 'partially_processed')):
+        return 'partially_processed'
+    return 'draft'
+
 
 class ImportOrderQueue(models.Model):
     _name = 'import.order.queue'
@@ -19,26 +59,44 @@ class ImportOrderQueue(models.Model):
         ('partially_processed', 'Partially Processed'),
         ('processed', 'Processed'),
         ('failed', 'Failed'),
-    ], compute='_compute_state', store=True, tracking=True)
+    ], default='draft', readonly=True, copy=False, tracking=True)
 
     line_ids = fields.One2many('import.order.queue.line', 'queue_id', string='Orders', readonly=True)
     log_ids = fields.One2many('import.order.queue.log', 'order_queue_id', string='Logs', readonly=True)
     change_state_on_apotheke = fields.Boolean(string='Change state on Shop Apotheke', default=False)
-
-    @api.depends('line_ids.state')
-    def _compute_state(self):
-        for record in self:
-            states = record.line_ids.mapped('state')
-            if not states:
-                record.state = 'draft'
-            elif all(state == 'processed' for state in states):
-                record.state = 'processed'
-            elif all(state == 'failed' for state in states):
-                record.state = 'failed'
-            elif any(state in ('processed', 'failed') for state in states):
-                record.state = 'partially_processed'
-            else:
-                record.state = 'draft'
+    checkpoint_count = fields.Integer(string='Orders Processed', readonly=True, copy=False)
+    last_checkpoint = fields.Datetime(string='Last Checkpoint', readonly=True, copy=False)
+    done_date = fields.Datetime(string='Completed On', readonly=True, copy=False)
+
+    def _refresh_states(self):
+        """
+        Derive the state of the queues from one grouped count of their line
+        states. Called once per processed chunk instead of recomputing the
+        queue on every line state change.
+
+        :return: dict mapping the queue id to the {state: count} of its lines
+        """
+        if not self:
+            return {}
+        self.env['import.order.queue.line'].flush_model(['queue_id', 'state'])
+        self.env.cr.execute("""
+            SELECT queue_id, state, COUNT(*)
+              FROM import_order_queue_line
+             WHERE queue_id IN %s
+          GROUP BY queue_id, state
+        """, [tuple(self.ids)])
+        counts = defaultdict(dict)
+        for queue_id, state, count in self.env.cr.fetchall():
+            counts[queue_id][state] = count
+
+        to_write = defaultdict(list)
+        for queue in self:
+            state = _aggregate_state(counts[queue.id])
+            if queue.state != state:
+                to_write[state].append(queue.id)
+        for state, queue_ids in to_write.items():
+            self.browse(queue_ids).write({'state': state})
+        return counts
 
     @api.model
     def create(self, vals):
@@ -47,115 +105,37 @@ class ImportOrderQueue(models.Model):
         return super().create(vals)
 
     def action_create_orders(self):
+        """
+        Hand the draft lines of the queues over to the order workers, which
+        create the sale orders in the background (see
+        ``import.order.queue.line._cron_process_order_jobs``).
+        """
+        lines = self.line_ids._enqueue_order_jobs()
+        if lines:
+            notif_msg = f"{len(lines)} Apotheke orders queued for creation."
+            notif_type = 'info'
+        else:
+            notif_msg = "There are no draft orders to create."
+            notif_type = 'warning'
+        self.env['bus.bus']._sendone(
+            self.env.user.partner_id,
+            'simple_notification',
+            {'title': 'Order Import', 'message': notif_msg, 'type': notif_type}
+        )
+
+    def _finalize_order_creation(self):
+        """Report the outcome of queues whose lines have all been handled, their state is set by _refresh_states."""
         Bus = self.env['bus.bus']
-        SaleOrder = self.env['sale.order']
-        SaleOrderLine = self.env['sale.order.line']
+        Log = self.env['apotheke.import.operation.log']
 
         for queue in self:
-            all_states = []
-            for line in queue.line_ids:
-                line_log_msgs = []
-                # Search if the Sale Order already exists
-                if SaleOrder.search_count([('apotheke_order_id', '=', line.apotheke_order_id)]):
-                    line.state = 'failed'
-                    msg = f"Order {line.apotheke_order_id} already exists. Skipping."
-                    line_log_msgs.append((0, 0, {
-                        'message': msg, 'status': 'error'
-                    }))
-                    line.log_ids = line_log_msgs
-                    all_states.append(line.state)
-                    line.order_lines_ids.write({'state': 'failed'})
-                    continue
-
-                if not line.partner_id:
-                    line.state = 'failed'
-                    msg = f"No customer linked for Apotheke Order {line.apotheke_order_id}."
-                    line_log_msgs.append((0, 0, {
-                        'message': msg, 'status': 'error'
-                    }))
-                    line.log_ids = line_log_msgs
-                    all_states.append(line.state)
-                    line.order_lines_ids.write({'state': 'failed'})
-                    continue
-
-                try:
-                    sale_order_vals = {
-                        'partner_id': line.partner_id.id,
-                        'apotheke_order_id': line.apotheke_order_id,
-                        'order_reference_for_customer': line.order_reference_for_customer,
-                        'apotheke_tax_ids': [(6, 0, line.apotheke_tax_ids.ids)],
-                        'from_apotheke': True,
-                        'shop_id': queue.shop_id.id,
-                        'channel_id': queue.channel_id.id,
-                    }
-                    order = SaleOrder.create(sale_order_vals)
-
-                    line_states = []
-                    for ol in line.order_lines_ids:
-                        if not ol.product_id:
-                            msg = f"Missing product for line {ol.name or ol.apotheke_line_id}."
-                            ol.state = 'failed'
-                            line_states.append('failed')
-                            line_log_msgs.append((0, 0, {
-                                'message': msg, 'status': 'error'
-                            }))
-                            continue
-
-                        so_line = SaleOrderLine.create({
-                            'order_id': order.id,
-                            'product_id': ol.product_id.id,
-                            'product_uom_qty': ol.product_uom_qty,
-                            'price_unit': ol.price_unit,
-                            'name': ol.name or ol.product_id.name,
-                            'apotheke_line_id': ol.apotheke_line_id,
-                            'commission': ol.commission,
-                            'apotheke_state': ol.apotheke_state,
-                            'tax_id': [(6, 0, ol.tax_id.mapped('tax_id').ids)],
-                        })
-                        ol.state = 'processed'
-                        line_states.append('processed')
-
-                    # Confirm the order and accept it in Shop Apotheke.
-                    order.action_confirm()
-                    if queue.change_state_on_apotheke:
-                        order.accept_on_apotheke()
-
-                    # Determine state of this line
-                    if all(state == 'processed' for state in line_states):
-                        line.state = 'processed'
-                        line_log_msgs.append((0, 0, {
-                            'message': f"Successfully created Order {order.name}.", 'status': 'success'
-                        }))
-                    elif any(state == 'processed' for state in line_states):
-                        line.state = 'processed'
-                        line_log_msgs.append((0, 0, {
-                            'message': f"Partially created Order {order.name} (some lines skipped).", 'status': 'info'
-                        }))
-                    else:
-                        line.state = 'failed'
-                        line_log_msgs.append((0, 0, {
-                            'message': f"Order creation failed due to invalid lines.", 'status': 'error'
-                        }))
-                except Exception as e:
-                    line.state = 'failed'
-                    line_log_msgs.append((0, 0, {
-                        'message': f"Unexpected error: {str(e)}", 'status': 'error'
-                    }))
-
-                line.log_ids = line_log_msgs
-                all_states.append(line.state)
-
-            # Set global queue state
-            if all(state == 'processed' for state in all_states):
-                queue.state = 'processed'
+            if queue.state == 'processed':
                 log_status = 'success'
                 notif_msg = f"All Apotheke orders created successfully for queue {queue.name}."
-            elif any(state == 'processed' for state in all_states):
-                queue.state = 'partially_processed'
+            elif queue.state == 'partially_processed':
                 log_status = 'info'
                 notif_msg = f"Some Apotheke orders were created successfully for queue {queue.name}."
             else:
-                queue.state = 'failed'
                 log_status = 'danger'
                 notif_msg = f"No Apotheke orders could be created for queue {queue.name}."
 
@@ -169,19 +149,63 @@ class ImportOrderQueue(models.Model):
                 'status': log_state
             })]
 
+            queue.done_date = fields.Datetime.now()
+
+            Log.create({
+                'setting_id': queue.setting_id.id,
+                'shop_id': queue.shop_id.id,
+                'channel_id': queue.channel_id.id,
+                'state': 'success',
+                'note': _('Processed order queue: %s') % queue.name,
+            })
+
+            # Workers run as the cron user, notify the user who imported the queue
             Bus._sendone(
-                self.env.user.partner_id,
+                queue.create_uid.partner_id,
                 'simple_notification',
                 {'title': 'Order Import', 'message': notif_msg, 'type': log_status}
             )
 
+    def _save_checkpoint(self, processed_counts):
+        """
+        Record the progress of the queues ({queue id: processed lines}), refresh
+        their states and finalize the ones without draft lines left, then commit.
+        Several workers checkpoint the same queue, so the queue rows are locked
+        first and the transaction is replayed when another worker got there first.
+        """
+        for attempt in range(1, CHECKPOINT_MAX_TRIES + 1):
+            try:
+                self.env.cr.execute("""
+                    SELECT id FROM import_order_queue WHERE id IN %s ORDER BY id FOR UPDATE
+                """, [tuple(self.ids)])
+                self.invalidate_recordset()
+                for queue in self:
+                    queue.write({
+                        'checkpoint_count': queue.checkpoint_count + processed_counts.get(queue.id, 0),
+                        'last_checkpoint': fields.Datetime.now(),
+                    })
+                counts = self._refresh_states()
+                self.filtered(
+                    lambda q: not q.done_date and not counts[q.id].get('draft')
+                )._finalize_order_creation()
+                self.env.cr.commit()
+                break
+            except psycopg2.errors.TransactionRollbackError:
+                self.env.cr.rollback()
+                if attempt == CHECKPOINT_MAX_TRIES:
+                    raise
+        for queue in self:
+            _logger.info("Order queue %s: checkpoint after %s orders", queue.name, queue.checkpoint_count)
+
     def action_retry_all_failed_lines(self):
         for queue in self:
-            failed_lines = queue.line_ids.filtered(lambda l: l.state == 'failed')
+            failed_lines = self.env['import.order.queue.line'].search([
+                ('queue_id', '=', queue.id),
+                ('state', '=', 'failed'),
+            ])
             if not failed_lines:
                 raise UserError(_('There are no failed lines to retry.'))
-            for line in failed_lines:
-                line.action_retry_order_creation()
+            failed_lines._retry_order_creation()
 
 
 class ImportOrderQueueLine(models.Model):
@@ -191,7 +215,7 @@ class ImportOrderQueueLine(models.Model):
     _rec_name = 'apotheke_order_id'
 
     queue_id = fields.Many2one('import.order.queue', string='Order Queue', ondelete='cascade')
-    apotheke_order_id = fields.Char(string='Apotheke Order ID')
+    apotheke_order_id = fields.Char(string='Apotheke Order ID', index='btree_not_null')
     partner_id = fields.Many2one('res.partner', string='Customer')
     order_reference_for_customer = fields.Char(string='Order Reference (For Customer)')
     apotheke_tax_ids = fields.Many2many('apotheke.tax', string='Apotheke Taxes')
@@ -202,34 +226,371 @@ class ImportOrderQueueLine(models.Model):
         ('partially_processed', 'Partially Processed'),
         ('processed', 'Processed'),
         ('failed', 'Failed'),
-    ], compute='_compute_state', store=True, tracking=True)
+    ], default='draft', copy=False, tracking=True)
     total_amount = fields.Float(string='Total Amount', compute='_compute_total_amount', store=True)
     company_id = fields.Many2one('res.company', 'Company', default=lambda self: self.env.company)
     currency_id = fields.Many2one('res.currency', related='company_id.currency_id')
-
-    @api.depends('order_lines_ids.state')
-    def _compute_state(self):
-        for line in self:
-            states = line.order_lines_ids.mapped('state')
-            if not states:
-                line.state = 'draft'
-            elif all(s == 'processed' for s in states):
-                line.state = 'processed'
-            elif all(s == 'failed' for s in states):
-                line.state = 'failed'
-            elif any(s in ('processed', 'failed') for s in states):
-                line.state = 'partially_processed'
-            else:
-                line.state = 'draft'
+    sale_order_id = fields.Many2one('sale.order', string='Sale Order', readonly=True, copy=False)
+    raw_order_data = fields.Binary(
+        string='Raw Order Data', attachment=False, readonly=True, copy=False,
+        help='Compressed JSON payload of the order as downloaded from Shop Apotheke.'
+    )
+    job_state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Job State', default='pending', readonly=True, copy=False)
+    job_failure_count = fields.Integer(string='Failed Attempts', readonly=True, copy=False)
+    job_error = fields.Text(string='Last Job Error', readonly=True, copy=False)
+    accept_failure_count = fields.Integer(string='Failed Acceptances', readonly=True, copy=False)
 
     @api.depends('order_lines_ids.total_amount')
     def _compute_total_amount(self):
         for record in self:
             record.total_amount = sum(line.total_amount for line in record.order_lines_ids)
 
+    @api.model
+    def _compress_order_data(self, order):
+        """Return the value stored in ``raw_order_data`` for an order payload."""
+        return base64.b64encode(zlib.compress(json.dumps(order).encode()))
+
+    @api.model
+    def _get_raw_orders(self, apotheke_order_ids):
+        """Return {apotheke order id: order payload} from the snapshots kept on the queue lines."""
+        result = {}
+        lines = self.search_read(
+            [('apotheke_order_id', 'in', list(apotheke_order_ids)), ('raw_order_data', '!=', False)],
+            ['apotheke_order_id', 'raw_order_data'],
+            order='id desc',
+        )
+        for line in lines:
+            if line['apotheke_order_id'] in result:
+                continue
+            try:
+                data = zlib.decompress(base64.b64decode(line['raw_order_data']))
+                result[line['apotheke_order_id']] = json.loads(data)
+            except (ValueError, zlib.error):
+                _logger.warning("Unreadable order snapshot on queue line %s", line['id'])
+        return result
+
+    def _enqueue_order_jobs(self):
+        """Make the draft lines claimable by the order workers again and wake the workers up."""
+        lines = self.filtered(lambda l: l.state == 'draft')
+        lines.write({
+            'job_state': 'pending',
+            'job_failure_count': 0,
+            'job_error': False,
+        })
+        self._trigger_order_workers()
+        return lines
+
+    @api.model
+    def _trigger_order_workers(self):
+        for xmlid in ORDER_WORKER_CRONS:
+            cron = self.env.ref(xmlid, raise_if_not_found=False)
+            if cron and cron.active:
+                cron.sudo()._trigger()
+
+    @api.model
+    def _claim_order_jobs(self):
+        """
+        Lock a chunk of pending lines, of any queue, for the current transaction.
+        Rows locked by another worker are skipped instead of waited for, so the
+        workers share the lines of one large queue as well.
+        """
+        self.env.flush_all()
+        batch_size = min(self.env['shop.apotheke.connector.setting'].sudo().search([]).mapped(
+            'order_commit_batch_size'), default=0)
+        self.env.cr.execute("""
+            SELECT id
+              FROM import_order_queue_line
+             WHERE state = 'draft'
+               AND job_state = 'pending'
+          ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [max(batch_size, 1)])
+        return self.browse([line_id for line_id, in self.env.cr.fetchall()])
+
+    @api.model
+    def _cron_process_order_jobs(self):
+        """
+        Order worker. Claims chunks of pending lines and creates their sale orders,
+        committing after each chunk. The same method runs in several worker crons,
+        so orders are created in parallel across the cron threads of the server
+        (``max_cron_threads``). The queue states are refreshed after the chunk is
+        committed, see ``_save_checkpoint``.
+        """
+        deadline = time.monotonic() + ORDER_JOB_TIME_LIMIT
+        # Orders committed by a run that stopped before accepting them
+        self._recover_acceptances(deadline)
+        while time.monotonic() < deadline:
+            lines = self._claim_order_jobs()
+            if not lines:
+                break
+            queues = lines.queue_id
+            line_ids = lines.ids
+            processed_counts = Counter(line.queue_id.id for line in lines)
+            try:
+                lines._run_order_jobs()
+                self.env.cr.commit()
+            except Exception:
+                error_trace = traceback.format_exc()
+                self.env.cr.rollback()
+                _logger.error("Order worker failed on lines %s\n%s", line_ids, error_trace)
+                self.browse(line_ids).exists()._register_job_failure(error_trace)
+                self.env.cr.commit()
+                processed_counts = {}
+            else:
+                # Only committed orders are accepted on the marketplace, in a short
+                # transaction of their own that just records the results
+                try:
+                    self._claim_accept_jobs(line_ids)._accept_created_orders()
+                    self.env.cr.commit()
+                except Exception:
+                    self.env.cr.rollback()
+                    _logger.exception("Order worker failed to accept the orders of lines %s", line_ids)
+            queues = queues.exists()
+            if queues:
+                queues._save_checkpoint(processed_counts)
+
+    @api.model
+    def _claim_accept_jobs(self, line_ids=None, limit=None):
+        """
+        Lock a chunk of lines (among ``line_ids`` if given) whose sale order was
+        committed but is still to be accepted on Shop Apotheke, skipping the lines
+        locked by another worker so an order is never accepted twice.
+        """
+        self.env.flush_all()
+        batch_size = limit or min(self.env['shop.apotheke.connector.setting'].sudo().search([]).mapped(
+            'order_commit_batch_size'), default=0)
+        self.env.cr.execute("""
+            SELECT l.id
+              FROM import_order_queue_line l
+              JOIN import_order_queue q ON q.id = l.queue_id
+              JOIN sale_order so ON so.id = l.sale_order_id
+             WHERE q.change_state_on_apotheke
+               AND so.accepted_on_apotheke IS NOT TRUE
+               AND COALESCE(l.accept_failure_count, 0) < %s
+               AND (%s OR l.id = ANY(%s::int[]))
+          ORDER BY l.id
+             LIMIT %s
+               FOR UPDATE OF l SKIP LOCKED
+        """, [ORDER_JOB_MAX_ATTEMPTS, line_ids is None, list(line_ids or []), max(batch_size, 1)])
+        return self.browse([line_id for line_id, in self.env.cr.fetchall()])
+
+    @api.model
+    def _recover_acceptances(self, deadline):
+        """Accept the committed orders left unaccepted, e.g. when a worker was killed after its commit."""
+        while time.monotonic() < deadline:
+            lines = self._claim_accept_jobs()
+            if not lines:
+                break
+            try:
+                lines._accept_created_orders()
+                self.env.cr.commit()
+            except Exception:
+                self.env.cr.rollback()
+                _logger.exception("Order worker failed to accept the orders of lines %s", lines.ids)
+                break
+
+    def _run_order_jobs(self):
+        for line in self:
+            try:
+                with self.env.cr.savepoint():
+                    line._process_order_creation()
+                    line.job_state = 'done'
+            except Exception:
+                line._register_job_failure(traceback.format_exc())
+
+    def _accept_created_orders(self, partner=None):
+        """
+        Accept the sale orders created from these lines in one concurrent stage,
+        when the queue asks for it. Failed acceptances are counted on the line and
+        retried by the workers until ORDER_JOB_MAX_ATTEMPTS is reached.
+
+        :param partner: receives one summary notification, by default the user
+            who imported each queue is notified
+        """
+        to_accept = self.filtered(lambda l: l.sale_order_id and l.queue_id.change_state_on_apotheke)
+        if not to_accept:
+            return
+        orders = to_accept.sale_order_id.filtered(lambda o: not o.accepted_on_apotheke)
+        accepted, failures = orders._accept_on_apotheke()
+        for line in to_accept:
+            if line.sale_order_id.id in failures:
+                line.write({
+                    'accept_failure_count': line.accept_failure_count + 1,
+                    'log_ids': [(0, 0, {
+                        'message': f"Failed to accept Order {line.sale_order_id.name} on Apotheke: "
+                                   f"{failures[line.sale_order_id.id]}",
+                        'status': 'error',
+                    })],
+                })
+        if partner:
+            orders._notify_acceptance(partner, accepted, failures)
+            return
+        # Workers run as the cron user, notify the user who imported each queue
+        for partner in to_accept.queue_id.create_uid.partner_id:
+            partner_orders = to_accept.filtered(lambda l: l.queue_id.create_uid.partner_id == partner).sale_order_id
+            orders._notify_acceptance(
+                partner,
+                accepted & partner_orders,
+                {order_id: error for order_id, error in failures.items() if order_id in partner_orders.ids},
+            )
+
+    def _register_job_failure(self, error):
+        """Count a failed attempt, the line stays pending until ORDER_JOB_MAX_ATTEMPTS is reached."""
+        for line in self:
+            failures = line.job_failure_count + 1
+            vals = {
+                'job_failure_count': failures,
+                'job_error': error,
+            }
+            if failures >= ORDER_JOB_MAX_ATTEMPTS:
+                vals.update({
+                    'job_state': 'failed',
+                    'state': 'failed',
+                    'log_ids': [(0, 0, {
+                        'message': f"Order creation abandoned after {failures} failed attempts.",
+                        'status': 'error',
+                    })],
+                })
+            line.write(vals)
+
+    def _process_order_creation(self):
+        """Create and confirm the sale order of this queued Apotheke order, then record the outcome."""
+        self.ensure_one()
+        SaleOrder = self.env['sale.order']
+        SaleOrderLine = self.env['sale.order.line']
+        line = self
+        queue = line.queue_id
+        line_log_msgs = []
+
+        # Search if the Sale Order already exists
+        if SaleOrder.search_count([('apotheke_order_id', '=', line.apotheke_order_id)]):
+            line.state = 'failed'
+            msg = f"Order {line.apotheke_order_id} already exists. Skipping."
+            line_log_msgs.append((0, 0, {
+                'message': msg, 'status': 'error'
+            }))
+            line.log_ids = line_log_msgs
+            line.order_lines_ids.write({'state': 'failed'})
+            return
+
+        if not line.partner_id:
+            line.state = 'failed'
+            msg = f"No customer linked for Apotheke Order {line.apotheke_order_id}."
+            line_log_msgs.append((0, 0, {
+                'message': msg, 'status': 'error'
+            }))
+            line.log_ids = line_log_msgs
+            line.order_lines_ids.write({'state': 'failed'})
+            return
+
+        try:
+            with self.env.cr.savepoint():
+                sale_order_vals = {
+                    'partner_id': line.partner_id.id,
+                    'apotheke_order_id': line.apotheke_order_id,
+                    'order_reference_for_customer': line.order_reference_for_customer,
+                    'apotheke_tax_ids': [(6, 0, line.apotheke_tax_ids.ids)],
+                    'from_apotheke': True,
+                    'shop_id': queue.shop_id.id,
+                    'channel_id': queue.channel_id.id,
+                }
+                order = SaleOrder.create(sale_order_vals)
+                line.sale_order_id = order
+
+                line_states = []
+                skipped_msgs = []
+                for ol in line.order_lines_ids:
+                    if not ol.product_id:
+                        msg = f"Missing product for line {ol.name or ol.apotheke_line_id}."
+                        ol.state = 'failed'
+                        line_states.append('failed')
+                        skipped_msgs.append((0, 0, {
+                            'message': msg, 'status': 'error'
+                        }))
+                        continue
+
+                    SaleOrderLine.create({
+                        'order_id': order.id,
+                        'product_id': ol.product_id.id,
+                        'product_uom_qty': ol.product_uom_qty,
+                        'price_unit': ol.price_unit,
+                        'name': ol.name or ol.product_id.name,
+                        'apotheke_line_id': ol.apotheke_line_id,
+                        'commission': ol.commission,
+                        'apotheke_state': ol.apotheke_state,
+                        'tax_id': [(6, 0, ol.tax_id.mapped('tax_id').ids)],
+                    })
+                    ol.state = 'processed'
+                    line_states.append('processed')
+
+                # Confirm the order, it is accepted in Shop Apotheke by _accept_created_orders
+                order.action_confirm()
+
+            line_log_msgs.extend(skipped_msgs)
+            # Determine state of this line
+            if all(state == 'processed' for state in line_states):
+                line.state = 'processed'
+                line_log_msgs.append((0, 0, {
+                    'message': f"Successfully created Order {order.name}.", 'status': 'success'
+                }))
+            elif any(state == 'processed' for state in line_states):
+                line.state = 'processed'
+                line_log_msgs.append((0, 0, {
+                    'message': f"Partially created Order {order.name} (some lines skipped).", 'status': 'info'
+                }))
+            else:
+                line.state = 'failed'
+                line_log_msgs.append((0, 0, {
+                    'message': f"Order creation failed due to invalid lines.", 'status': 'error'
+                }))
+        except (psycopg2.errors.TransactionRollbackError, psycopg2.OperationalError):
+            # Lock and serialization errors are transient, the job is retried in a fresh transaction
+            raise
+        except Exception as e:
+            line.state = 'failed'
+            line_log_msgs.append((0, 0, {
+                'message': f"Unexpected error: {str(e)}", 'status': 'error'
+            }))
+
+        line.log_ids = line_log_msgs
+
     def action_retry_order_creation(self):
         self.ensure_one()
-        Bus = self.env['bus.bus']
+        self._retry_order_creation()
+
+    def _retry_order_creation(self):
+        """
+        Create the sale orders of these lines again and send one summary
+        notification. The orders are accepted on Shop Apotheke together once the
+        transaction is committed, see ``_accept_after_commit``.
+        """
+        for line in self:
+            line._retry_line_order_creation()
+        self.queue_id._refresh_states()
+        self._accept_after_commit()
+
+        failed = self.filtered(lambda l: l.state == 'failed')
+        if len(self) == 1:
+            message = f"Retry result: {self.state.upper()} for {self.apotheke_order_id}"
+        else:
+            message = f"Retry result: {len(self) - len(failed)} orders created, {len(failed)} failed."
+        self.env['bus.bus']._sendone(
+            self.env.user.partner_id,
+            'simple_notification',
+            {
+                'title': 'Retry Order Creation',
+                'message': message,
+                'type': 'danger' if failed else 'success',
+            }
+        )
+
+    def _retry_line_order_creation(self):
+        self.ensure_one()
         SaleOrder = self.env['sale.order']
         SaleOrderLine = self.env['sale.order.line']
         line = self
@@ -278,6 +639,7 @@ class ImportOrderQueueLine(models.Model):
                 'channel_id': line.queue_id.channel_id.id,
             }
             order = SaleOrder.create(order_vals)
+            line.sale_order_id = order
 
             line_states = []
             for ol in line.order_lines_ids:
@@ -304,10 +666,9 @@ class ImportOrderQueueLine(models.Model):
                 ol.state = 'processed'
                 line_states.append('processed')
 
-            # Confirm the order and accept it in Shop Apotheke.
+            # Confirm the order, it is accepted in Shop Apotheke by _accept_after_commit
             order.action_confirm()
-            if self.queue_id.change_state_on_apotheke:
-                order.accept_on_apotheke()
+            line.accept_failure_count = 0
 
             # Determine overall line state
             if all(s == 'processed' for s in line_states):
@@ -333,15 +694,27 @@ class ImportOrderQueueLine(models.Model):
 
         line.log_ids = line_log_msgs
 
-        Bus._sendone(
-            self.env.user.partner_id,
-            'simple_notification',
-            {
-                'title': 'Retry Order Creation',
-                'message': f"Retry result: {line.state.upper()} for {line.apotheke_order_id}",
-                'type': 'success' if line.state != 'failed' else 'danger'
-            }
-        )
+    def _accept_after_commit(self):
+        """
+        Accept the orders of these lines once the current transaction is committed,
+        so an order is never accepted on Shop Apotheke before it exists in Odoo.
+        Orders left unaccepted are picked up by the order workers.
+        """
+        line_ids = self.ids
+        registry, uid, context = self.env.registry, self.env.uid, dict(self.env.context)
+
+        @self.env.cr.postcommit.add
+        def _accept_lines():
+            try:
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, uid, context)
+                    QueueLine = env['import.order.queue.line']
+                    QueueLine._claim_accept_jobs(line_ids, limit=len(line_ids))._accept_created_orders(
+                        env.user.partner_id)
+            except Exception:
+                _logger.exception("Failed to accept the retried orders of lines %s", line_ids)
+                with registry.cursor() as cr:
+                    api.Environment(cr, uid, context)['import.order.queue.line']._trigger_order_workers()
 
 
 class ImportOrderQueueLog(models.Model):
@@ -132,7 +132,8 @@ class ImportProductQueueLine(models.Model):
     sku = fields.Char(string='SKU')
     ean = fields.Char(string='EAN')
     brand = fields.Char(string='Brand')
-    main_image = fields.Binary(string='Main Image')
+    main_image = fields.Image(string='Main Image', max_width=1920, max_height=1920)
+    image_url = fields.Char(string='Image URL')
     state = fields.Selection([
         ('draft', 'Draft'),
         ('processed', 'Processed'),
@@ -2,12 +2,19 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, api
-import requests
-from odoo.exceptions import UserError
+from odoo.tools import split_every
 import logging
+from collections import defaultdict
 
 _logger = logging.getLogger(__name__)
 
+# Key of the offers waiting to be pushed in the post-commit data of a transaction
+OFFER_OUTBOX_KEY = 'apotheke.product.offer.outbox'
+# Offers sent per POST /api/offers call
+OFFER_PUSH_BATCH_SIZE = 100
+# Products handled per commit by the stock synchronization cron
+STOCK_SYNC_BATCH_SIZE = 500
+
 
 class ApothekeProductOffer(models.Model):
     _name = 'apotheke.product.offer'
@@ -20,7 +27,7 @@ class ApothekeProductOffer(models.Model):
     offer_active = fields.Boolean(string='Active Offer', default=True, readonly=True)
     shop_offer_id = fields.Char(string='Shop Offer ID', readonly=True)
     product_sku = fields.Char(string='Product SKU', readonly=True)
-    product_ean = fields.Char(string='Product EAN', readonly=True)
+    product_ean = fields.Char(string='Product EAN', readonly=True, index='btree_not_null')
     price = fields.Float(string='Price', required=True)
     quantity = fields.Integer(string='Quantity', required=True)
     channel_ids = fields.Many2many(
@@ -99,56 +106,144 @@ class ApothekeProductOffer(models.Model):
 
     def write(self, vals):
         """
-        Override the write method to automatically update the offer on Shop Apotheke
-        if either the price or quantity is modified.
+        Push price and quantity changes to Shop Apotheke. Writes made with
+        ``apotheke_sync_origin='inbound'`` in the context mirror data that comes
+        from the marketplace (imports, confirmed updates) and are never pushed
+        back. Other changes are collected in the transaction outbox and sent once
+        the transaction is committed, so a rolled back write is never published.
         """
-        update_needed = False
-        fields_to_check = ['price', 'quantity']
+        result = super(ApothekeProductOffer, self).write(vals)
+        if ('price' in vals or 'quantity' in vals) and self.env.context.get('apotheke_sync_origin') != 'inbound':
+            self._add_to_push_outbox()
+        return result
+
+    def _add_to_push_outbox(self):
+        postcommit = self.env.cr.postcommit
+        outbox = postcommit.data.get(OFFER_OUTBOX_KEY)
+        if outbox is None:
+            outbox = postcommit.data[OFFER_OUTBOX_KEY] = set()
+            registry, uid, context = self.env.registry, self.env.uid, dict(self.env.context)
 
-        for record in self:
-            new_price = vals.get('price', record.price)
-            new_quantity = vals.get('quantity', record.quantity)
+            @postcommit.add
+            def _push_outbox():
+                # The transaction is closed, push and notify from a new cursor
+                try:
+                    with registry.cursor() as cr:
+                        env = api.Environment(cr, uid, context)
+                        env['apotheke.product.offer'].browse(sorted(outbox)).exists()._push_offers()
+                except Exception:
+                    _logger.exception("Failed to push offers %s to Shop Apotheke", sorted(outbox))
+        outbox.update(self.ids)
 
-            # Only send API update if price or quantity actually changed
-            if 'price' in vals or 'quantity' in vals:
-                update_needed = True
+    def _prepare_push_payload(self, price=None, quantity=None):
+        self.ensure_one()
+        return {
+            "price": self.price if price is None else price,
+            "product_id": self.product_ean,
+            "product_id_type": "EAN",
+            "quantity": self.quantity if quantity is None else quantity,
+            "state_code": self.state_code,
+            "shop_sku": self.offer_sku,
+            "update_delete": "update",
+        }
+
+    def _push_offers(self, values=None, notify=True):
+        """
+        Send the price and quantity of the offers to Shop Apotheke, grouped by shop
+        in multi-offer payloads of OFFER_PUSH_BATCH_SIZE offers. Every chunk is one
+        POST with one response check and one summary notification.
 
+        :param values: optional {offer id: {'price': ..., 'quantity': ...}} sent
+            instead of the stored values
+        :param notify: send the summary notifications to the current user, disabled
+            for non-interactive callers such as crons (failures are logged anyway)
+        :return: the offers of the chunks accepted by the API
+        """
+        values = values or {}
+        pushed = self.browse()
+        for shop in self.shop_id:
+            offers = self.filtered(lambda o: o.shop_id == shop)
+            setting = shop.setting_id
+            if not setting:
+                _logger.warning("No connector setting found for the shop %s.", shop.name)
+                if notify:
+                    self._send_notification('danger', f"No connector setting found for the shop {shop.name}.")
+                continue
+
+            client = setting._get_api_client()
+            params = {
+                "shop_id": shop.shop_number
+            }
+            for chunk in split_every(OFFER_PUSH_BATCH_SIZE, offers.ids, self.browse):
+                payload = {
+                    "offers": [offer._prepare_push_payload(**values.get(offer.id, {})) for offer in chunk]
+                }
                 try:
-                    setting = record.shop_id.setting_id
-                    if not setting:
-                        raise UserError("No connector setting found for the shop.")
-
-                    url = f"{setting.server}/api/offers"
-                    headers = {
-                        "Authorization": f"{setting.api_key}",
-                        "Content-Type": "application/json",
-                    }
-                    params = {
-                        "shop_id": record.shop_id.shop_number
-                    }
-                    payload = {
-                        "offers": [
-                            {
-                                "price": new_price,
-                                "product_id": record.product_ean,
-                                "product_id_type": "EAN",
-                                "quantity": new_quantity,
-                                "state_code": record.state_code,
-                                "shop_sku": record.offer_sku,
-                            }
-                        ]
-                    }
-
-                    response = requests.post(url, json=payload, headers=headers, params=params)
+                    response = client.post('/api/offers', json=payload, params=params)
                     response.raise_for_status()
-                    resp_data = response.json()
-
-                    self._send_notification('success', f"Offer update successful for {record.offer_sku}")
+                    import_id = response.json().get('import_id')
                 except Exception as e:
-                    self._send_notification('danger', f"Offer update failed for {record.offer_sku}: {str(e)}")
+                    _logger.warning("Offer update failed for %s offers of shop %s: %s", len(chunk), shop.name, e)
+                    if notify:
+                        self._send_notification(
+                            'danger', f"Offer update failed for {len(chunk)} offers of {shop.name}: {str(e)}")
+                    continue
+
+                pushed |= chunk
+                if notify:
+                    self._send_notification(
+                        'success', f"Offer update sent for {len(chunk)} offers of {shop.name} (import {import_id}).")
+
+        without_shop = self.filtered(lambda o: not o.shop_id)
+        if without_shop:
+            message = f"No shop set on offers {', '.join(o.offer_sku or str(o.id) for o in without_shop)}."
+            _logger.warning("%s", message)
+            if notify:
+                self._send_notification('danger', message)
+        return pushed
+
+    @api.model
+    def _cron_sync_stock_quantities(self):
+        """
+        Push the on-hand quantity of every product whose stock changed since its
+        last Apotheke update (``apotheke_qty_updated`` unset), along with the
+        offer's own price. Quantities are computed for a whole batch of templates
+        at once and sent through _push_offers, the progress is committed after
+        each batch.
+        """
+        all_offers = self.search([('product_id.odoo_product_id.apotheke_qty_updated', '=', False)])
+        templates = all_offers.product_id.odoo_product_id
+        _logger.info("Syncing Apotheke stock of %s products", len(templates))
+
+        offers_by_template = defaultdict(list)
+        for offer in all_offers:
+            offers_by_template[offer.product_id.odoo_product_id.id].append(offer.id)
+
+        for batch in split_every(STOCK_SYNC_BATCH_SIZE, templates.ids, templates.browse):
+            offers = self.browse([offer_id for template_id in batch.ids
+                                  for offer_id in offers_by_template[template_id]])
+            # One quantity computation for the whole batch
+            qty_by_template = {template.id: template.qty_available for template in batch}
+
+            values = {}
+            for offer in offers:
+                template = offer.product_id.odoo_product_id
+                values[offer.id] = {
+                    'quantity': max(int(qty_by_template[template.id]), 0),
+                }
+
+            pushed = offers._push_offers(values, notify=False)
+            for offer in pushed:
+                # Already sent, only mirror the quantity locally
+                offer.with_context(apotheke_sync_origin='inbound').write(values[offer.id])
 
-        # Always proceed with the write after (or even if) API fails
-        return super(ApothekeProductOffer, self).write(vals)
+            # A product is up to date once all its offers were accepted
+            failed_templates = (offers - pushed).product_id.odoo_product_id
+            (batch - failed_templates).write({
+                'apotheke_qty_updated': True,
+                'last_update_datetime': fields.Datetime.now(),
+            })
+            self.env.cr.commit()
 
     def _send_notification(self, notif_type, message):
         self.env['bus.bus']._sendone(
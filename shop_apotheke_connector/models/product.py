@@ -4,9 +4,17 @@
 from odoo import models, fields, api, _
 import logging
 from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from .savepoint_batch import run_in_savepoints
 
 _logger = logging.getLogger(__name__)
 
+# Quants created and applied together by the bulk quantity update
+INVENTORY_BATCH_SIZE = 500
+# Product templates created per create() call when linking Apotheke products
+PRODUCT_SYNC_BATCH_SIZE = 200
+
 
 class ApothekeProduct(models.Model):
     _name = 'apotheke.product'
@@ -25,7 +33,7 @@ class ApothekeProduct(models.Model):
         tracking=True, readonly=True
 
     )
-    main_image = fields.Binary(string='Main Image', readonly=True)
+    main_image = fields.Image(string='Main Image', max_width=1920, max_height=1920, readonly=True)
     name = fields.Char(string='Product Name', required=True, tracking=True)
     sku = fields.Char(string='SKU', required=True, tracking=True, readonly=True)
     ean = fields.Char(string='EAN', required=False, tracking=True, readonly=True)
@@ -119,48 +127,58 @@ class ApothekeProduct(models.Model):
         Sends notification about how many were linked or created.
         """
         ProductTemplate = self.env['product.template']
-        updated = 0
-        created = 0
+        to_sync = self.filtered(lambda p: not (p.odoo_product_id and p.state_sync_odoo == 'synchronized'))
+
+        # Load every candidate template by SKU or EAN at once, keeping the search order
+        skus = [sku for sku in set(to_sync.mapped('sku')) if sku]
+        eans = [ean for ean in set(to_sync.mapped('ean')) if ean]
+        by_code = {}
+        by_ean = {}
+        if skus or eans:
+            candidates = ProductTemplate.search_read([
+                '&',
+                '|',
+                ('default_code', 'in', skus),
+                ('ean', 'in', eans),
+                ('type', '=', 'consu'),
+            ], ['default_code', 'ean'])
+            for rank, template in enumerate(candidates):
+                if template['default_code']:
+                    by_code.setdefault(template['default_code'], (rank, template['id']))
+                if template['ean']:
+                    by_ean.setdefault(template['ean'], (rank, template['id']))
+
+        links = {}
+        to_create = {}
+        for product in to_sync:
+            matches = [m for m in (by_code.get(product.sku), by_ean.get(product.ean)) if m]
+            if matches:
+                links.setdefault(min(matches)[1], self.browse())
+                links[min(matches)[1]] |= product
+            else:
+                # Products sharing a SKU get a single new template, as a search would find it
+                to_create.setdefault(product.sku, self.browse())
+                to_create[product.sku] |= product
+        updated = sum(len(products) for products in links.values())
 
-        for product in self:
-
-            try:
-                with self.env.cr.savepoint():  # Isolate each product sync
-                    if product.odoo_product_id and product.state_sync_odoo == 'synchronized':
-                        continue
-
-                    # Try to find an existing product by SKU or EAN
-                    existing_product = ProductTemplate.search([
-                        '&',
-                        '|',
-                        ('default_code', '=', product.sku),
-                        ('ean', '=', product.ean),
-                        ('type', '=', 'consu'),
-                    ], limit=1)
-
-                    if existing_product:
-                        product.odoo_product_id = existing_product.id
-                        product.state_sync_odoo = 'synchronized'
-                        updated += 1
-                    else:
-                        new_product = ProductTemplate.create({
-                            'name': product.name,
-                            'default_code': product.sku,
-                            'ean': product.ean,
-                            'is_storable': True,
-                            'image_1920': product.main_image,
-                            'image_128': product.main_image,
-                            'image_256': product.main_image,
-                            'image_512': product.main_image,
-                            'image_1024': product.main_image,
-                            'categ_id': product.category_id.id if product.category_id else False,
-                        })
-                        product.odoo_product_id = new_product.id
-                        product.state_sync_odoo = 'synchronized'
-                        created += 1
-
-            except Exception as e:
-                _logger.exception(f"!!! Error syncing product {product.sku}: {str(e)}")
+        created = 0
+        for batch in split_every(PRODUCT_SYNC_BATCH_SIZE, list(to_create.values())):
+            done, failed = run_in_savepoints(
+                self.env.cr,
+                [(products, products[0]._prepare_odoo_product_vals()) for products in batch],
+                lambda items: ProductTemplate.create([vals for _products, vals in items]),
+            )
+            for (products, _vals), e in failed:
+                _logger.error(f"!!! Error syncing product {products[0].sku}: {str(e)}")
+            for (products, _vals), template in done:
+                links[template.id] = products
+                created += len(products)
+
+        for template_id, products in links.items():
+            products.write({
+                'odoo_product_id': template_id,
+                'state_sync_odoo': 'synchronized',
+            })
 
         notif_type = 'success' if updated or created else 'warning'
         message = _("Synchronization complete: %d linked, %d created.") % (updated, created)
@@ -176,6 +194,18 @@ class ApothekeProduct(models.Model):
         except Exception as notif_error:
             _logger.exception(f"!!! Notification failed: {notif_error}")
 
+    def _prepare_odoo_product_vals(self):
+        self.ensure_one()
+        return {
+            'name': self.name,
+            'default_code': self.sku,
+            'ean': self.ean,
+            'is_storable': True,
+            # The smaller image sizes are generated from image_1920 by Odoo
+            'image_1920': self.main_image,
+            'categ_id': self.category_id.id if self.category_id else False,
+        }
+
     def action_update_odoo_product_quantities(self):
         """
         Update Odoo inventory quantities for each linked product
@@ -191,33 +221,43 @@ class ApothekeProduct(models.Model):
         if not warehouse:
             raise UserError(_("No warehouse found for the current company."))
 
+        # Assume single variant products, the last product linked to a variant wins
+        products_by_variant = {}
         for product in self:
-            try:
-                with self.env.cr.savepoint():
-                    if not product.odoo_product_id:
-                        skipped += 1
-                        continue
-
-                    # Assume single variant products
-                    product_variant = product.odoo_product_id.product_variant_id
-                    if not product_variant:
-                        skipped += 1
-                        continue
-
-                    quant_vals = {
-                        'product_id': product_variant.id,
-                        'location_id': warehouse.lot_stock_id.id,
-                        'inventory_quantity': product.available_qty,
-                    }
-
-                    # Create or update quant and apply inventory
-                    StockQuant.with_context(inventory_mode=True).create(quant_vals)._apply_inventory()
-                    updated += 1
-                    product.qty_updated = True
-
-            except Exception as e:
-                failed += 1
-                _logger.exception(f"Failed to update quantity for product {product.name}: {str(e)}")
+            product_variant = product.odoo_product_id.product_variant_id
+            if not product_variant:
+                skipped += 1
+                continue
+            products_by_variant.setdefault(product_variant.id, self.browse())
+            products_by_variant[product_variant.id] |= product
+
+        StockQuant = StockQuant.with_context(inventory_mode=True)
+        for variant_ids in split_every(INVENTORY_BATCH_SIZE, list(products_by_variant)):
+            quant_vals = {
+                variant_id: {
+                    'product_id': variant_id,
+                    'location_id': warehouse.lot_stock_id.id,
+                    'inventory_quantity': products_by_variant[variant_id][-1].available_qty,
+                }
+                for variant_id in variant_ids
+            }
+
+            def _apply_quants(batch_variant_ids):
+                # Create or update all quants and apply the inventory at once
+                StockQuant.create([quant_vals[variant_id] for variant_id in batch_variant_ids])._apply_inventory()
+                return batch_variant_ids
+
+            done, failed_variants = run_in_savepoints(self.env.cr, variant_ids, _apply_quants)
+            for variant_id, e in failed_variants:
+                products = products_by_variant[variant_id]
+                failed += len(products)
+                _logger.error(f"Failed to update quantity for product {products[-1].name}: {str(e)}")
+
+            done_products = self.browse()
+            for variant_id, _result in done:
+                done_products |= products_by_variant[variant_id]
+            done_products.write({'qty_updated': True})
+            updated += len(done_products)
 
         # Notify user
         notif_type = 'success' if updated else 'warning'
@@ -7,7 +7,7 @@ from odoo import models, fields, api
 class ProductCategory(models.Model):
     _inherit = 'product.template'
 
-    ean = fields.Char(string='EAN')
+    ean = fields.Char(string='EAN', index='btree_not_null')
     apotheke_qty_updated = fields.Boolean(string="Apotheke Qty Updated", default=False)
     last_update_datetime = fields.Datetime(string="Last Apotheke Update Time")
     transferred_to_apotheke = fields.Boolean(string="Transferred to Apotheke", default=False, readonly=False)
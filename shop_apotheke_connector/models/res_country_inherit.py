@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+from odoo import models, api, tools
+
+
+class ResCountry(models.Model):
+    _inherit = 'res.country'
+
+    @api.model
+    @tools.ormcache('iso_code')
+    def _get_apotheke_country_id(self, iso_code):
+        """Return the id of the country with the given ISO code, cached per registry."""
+        if not iso_code:
+            return False
+        return self.sudo().search([('code', '=', iso_code.upper())], limit=1).id or False
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if 'code' in vals:
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
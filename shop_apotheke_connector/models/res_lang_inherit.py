@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+from odoo import models, api, tools
+
+
+class ResLang(models.Model):
+    _inherit = 'res.lang'
+
+    @api.model
+    @tools.ormcache('locale')
+    def _get_apotheke_lang_code(self, locale):
+        """
+        Return the code of the active language matching a Shop Apotheke locale
+        (e.g. ``de_DE`` or ``de``), cached per registry. res.lang already clears
+        the registry cache whenever a language is created, changed or removed.
+        """
+        if not locale:
+            return False
+        codes = [code for code, _name in self.get_installed()]
+        if locale in codes:
+            return locale
+        prefix = locale.split('_')[0] + '_'
+        return next((code for code in codes if code.startswith(prefix)), False)
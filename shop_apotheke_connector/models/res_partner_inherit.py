@@ -7,5 +7,5 @@ from odoo import models, fields
 class ResPartner(models.Model):
     _inherit = 'res.partner'
 
-    apotheke_customer_id = fields.Char(string="Apotheke ID", readonly=True)
+    apotheke_customer_id = fields.Char(string="Apotheke ID", readonly=True, index='btree_not_null')
 
@@ -3,8 +3,34 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-import requests
+from odoo.tools import split_every
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import psycopg2
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of acceptance calls in flight at once
+ACCEPT_WORKERS = 8
+# Maximum number of ids sent in one order_ids filter
+FETCH_ORDER_IDS_LIMIT = 100
+
+
+def _send_acceptance(order_id, client, path, payload, params):
+    """Send one acceptance call, returns (order_id, error message or None). Thread-safe."""
+    try:
+        response = client.put(path, json=payload, params=params)
+    except Exception as e:
+        return order_id, str(e)
+    if response.status_code == 204:
+        return order_id, None
+    try:
+        data = response.json()
+        return order_id, data.get("message") or str(data)
+    except Exception:
+        return order_id, response.text
 
 
 class SaleOrder(models.Model):
@@ -36,151 +62,207 @@ class SaleOrder(models.Model):
                 order.accepted_on_apotheke = False
 
     def accept_on_apotheke(self):
-        """Accepts the order and its lines via the Apotheke API."""
+        """Accepts the orders and their lines via the Apotheke API and reports the result."""
+        accepted, failures = self._accept_on_apotheke()
+        self._notify_acceptance(self.env.user.partner_id, accepted, failures)
+
+    def _accept_on_apotheke(self):
+        """
+        Accept the orders on Shop Apotheke in three stages: the payloads are built
+        from the ORM, the PUT calls are sent concurrently over the pooled session of
+        each setting (at most ACCEPT_WORKERS at a time, still under the setting's
+        rate limit), then the results are written back serially.
+
+        Returns the accepted orders and a dict {order id: error message}.
+        """
+        failures = {}
+        requests_to_send = []
         for order in self:
             setting = order.shop_id.setting_id
-            api_key = setting.api_key
-            server_url = setting.server
             shop_number = order.shop_id.shop_number
-            ap_order_id = order.apotheke_order_id
-
-            if not (api_key and server_url and shop_number and ap_order_id):
-                raise UserError(_("Missing Apotheke configuration or order ID."))
+            if not (setting.api_key and setting.server and shop_number and order.apotheke_order_id):
+                failures[order.id] = _("Missing Apotheke configuration or order ID.")
+                continue
 
             # Collect order lines for payload
-            order_lines_payload = []
-            for line in order.order_line:
-                if line.apotheke_line_id:
-                    order_lines_payload.append({
-                        "accepted": True,
-                        "id": line.apotheke_line_id,
-                    })
+            order_lines_payload = [{
+                "accepted": True,
+                "id": line.apotheke_line_id,
+            } for line in order.order_line if line.apotheke_line_id]
 
             if not order_lines_payload:
-                self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-                    'type': 'warning',
-                    'sticky': False,
-                    'message': _("No valid order lines found for Apotheke order %s.") % order.name,
-                })
+                failures[order.id] = _("No valid order lines found for Apotheke order %s.") % order.name
                 continue
 
-            # Construct request
-            url = f"{server_url}/api/orders/{ap_order_id}/accept"
-            params = {
-                "shop_id": shop_number
-            }
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": api_key
-            }
-            payload = {
-                "order_lines": order_lines_payload
-            }
-
-            try:
-                response = requests.put(url, json=payload, headers=headers, params=params)
-
-                if response.status_code == 204:
-                    for line in order.order_line:
-                        line.accepted_on_apotheke = True
-                        line.apotheke_state = 'SHIPPING'
-                    self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-                        'type': 'success',
-                        'sticky': False,
-                        'message': _("Order %s accepted successfully on Apotheke.") % order.name,
-                    })
-
-                else:
-                    try:
-                        data = response.json()
-                        message = data.get("message") or str(data)
-                    except Exception:
-                        message = response.text
-                    self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-                        'type': 'danger',
-                        'sticky': False,
-                        'message': _("Failed to accept order %s: %s") % (order.name, message),
-                    })
-
-            except Exception as e:
-                self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-                    'type': 'danger',
-                    'sticky': False,
-                    'message': _("Error while accepting order %s: %s") % (order.name, str(e)),
-                })
+            requests_to_send.append((
+                order.id,
+                setting._get_api_client(),
+                f"/api/orders/{order.apotheke_order_id}/accept",
+                {"order_lines": order_lines_payload},
+                {"shop_id": shop_number},
+            ))
+
+        # Network stage, no ORM access in the threads
+        accepted_ids = []
+        if requests_to_send:
+            with ThreadPoolExecutor(max_workers=min(ACCEPT_WORKERS, len(requests_to_send))) as executor:
+                results = executor.map(lambda args: _send_acceptance(*args), requests_to_send)
+                for order_id, error in results:
+                    if error:
+                        failures[order_id] = error
+                    else:
+                        accepted_ids.append(order_id)
+
+        accepted = self.browse(accepted_ids)
+        accepted.order_line.write({
+            'accepted_on_apotheke': True,
+            'apotheke_state': 'SHIPPING',
+        })
+        return accepted, failures
+
+    @api.model
+    def _notify_acceptance(self, partner, accepted, failures):
+        """Send one summary notification for an acceptance run."""
+        if not (accepted or failures):
+            return
+        if failures:
+            failed_orders = self.browse(list(failures))
+            message = _("%s orders accepted on Apotheke, %s failed: %s") % (
+                len(accepted), len(failures),
+                "; ".join("%s: %s" % (order.name, failures[order.id]) for order in failed_orders))
+            notif_type = 'warning' if accepted else 'danger'
+        else:
+            message = _("%s orders accepted successfully on Apotheke.") % len(accepted)
+            notif_type = 'success'
+        self.env['bus.bus']._sendone(partner, 'simple_notification', {
+            'type': notif_type,
+            'sticky': bool(failures),
+            'message': message,
+        })
 
     def action_confirm(self):
         # Call the original confirm logic
         result = super().action_confirm()
 
-        # for each confirmed order, pull in external info
-        for order in self:
+        # Pull in the external info of the confirmed Apotheke orders
+        apotheke_orders = self.filtered('apotheke_order_id')
+        if apotheke_orders:
             try:
-                if order.apotheke_order_id:
-                    order.update_partner_infos()
+                with self.env.cr.savepoint():
+                    apotheke_orders.update_partner_infos()
+            except psycopg2.OperationalError:
+                # Lock and serialization errors are retried by the caller
+                raise
             except Exception as e:
                 # Catch any unexpected errors and notify
                 self.env['bus.bus']._sendone(
                     self.env.user.partner_id, 'simple_notification', {
                         'type': 'danger',
                         'sticky': True,
-                        'message': _("Failed to update external info for %s: %s") % (order.name, e)
+                        'message': _("Failed to update external info for %s: %s") % (
+                            ", ".join(apotheke_orders.mapped('name')), e)
                     })
 
         return result
 
-    def update_partner_infos(self):
-        """Fetches the order from the external API and writes all updatable
-        partner & address fields plus commitment_date."""
-        self.ensure_one()
+    def action_refresh_apotheke_infos(self):
+        """Re-download the orders from Shop Apotheke and update partner & delivery information."""
+        self.update_partner_infos(refresh=True)
 
+    def update_partner_infos(self, refresh=False):
+        """Writes all updatable partner & address fields plus commitment_date from
+        the Apotheke order payload. The snapshot kept on the import queue line is
+        used when there is one, the orders are only fetched from the external API
+        when ``refresh`` is set or no snapshot exists, in one call per setting."""
         # Sanity checks
-        setting = self.shop_id.setting_id
-        if not self.apotheke_order_id:
-            raise UserError(_("Order %s has no Apotheke order ID.") % self.name)
-        if not setting or not setting.server or not setting.api_key:
-            raise UserError(_("API configuration missing on Shop %s.") % (self.shop_id.name or _("(unknown)")))
-
-        # API request config
-        url = f"{setting.server}/api/orders"
-        params = {'order_ids': self.apotheke_order_id}
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': setting.api_key,
-        }
-
-        try:
-            resp = requests.get(url, params=params, headers=headers)
-        except Exception as e:
-            self.env['bus.bus']._sendone(
-                self.env.user.partner_id, 'simple_notification', {
-                    'type': 'danger',
-                    'sticky': True,
-                    'message': _("API request failed: %s") % str(e),
-                })
-            return
+        for order in self:
+            if not order.apotheke_order_id:
+                raise UserError(_("Order %s has no Apotheke order ID.") % order.name)
 
-        if resp.status_code != 200:
-            self.env['bus.bus']._sendone(
-                self.env.user.partner_id, 'simple_notification', {
-                    'type': 'danger',
-                    'sticky': True,
-                    'message': _("Error fetching order %s: %s") % (self.apotheke_order_id, resp.text),
-                })
-            return
+        order_data = {}
+        if not refresh:
+            order_data = self.env['import.order.queue.line']._get_raw_orders(self.mapped('apotheke_order_id'))
 
-        payload = resp.json()
-        orders = payload.get('orders') or []
-        if not orders:
-            self.env['bus.bus']._sendone(
-                self.env.user.partner_id, 'simple_notification', {
-                    'type': 'danger',
-                    'sticky': True,
-                    'message': _("No data returned for order %s.") % self.apotheke_order_id,
-                })
-            return
+        missing = self.filtered(lambda o: o.apotheke_order_id not in order_data)
+        if missing:
+            order_data.update(missing._fetch_apotheke_orders())
+
+        for order in self:
+            data = order_data.get(order.apotheke_order_id)
+            if not data:
+                self.env['bus.bus']._sendone(
+                    self.env.user.partner_id, 'simple_notification', {
+                        'type': 'danger',
+                        'sticky': True,
+                        'message': _("No data returned for order %s.") % order.apotheke_order_id,
+                    })
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    order._apply_apotheke_order_data(data)
+            except psycopg2.OperationalError:
+                # Lock and serialization errors are retried by the caller
+                raise
+            except Exception as e:
+                # A bad payload only skips the update of its own order
+                _logger.warning("Failed to update partner info of order %s: %s", order.name, e)
+                self.env['bus.bus']._sendone(
+                    self.env.user.partner_id, 'simple_notification', {
+                        'type': 'danger',
+                        'sticky': True,
+                        'message': _("Failed to update external info for %s: %s") % (order.name, e),
+                    })
+                continue
+
+            if refresh:
+                self.env['bus.bus']._sendone(
+                    self.env.user.partner_id, 'simple_notification', {
+                        'type': 'success',
+                        'sticky': False,
+                        'message': _("%s: partner information & delivery date updated.") % order.apotheke_order_id,
+                    })
 
-        data = orders[0]
+    def _fetch_apotheke_orders(self):
+        """Fetch the orders from the external API, batching the ids of each setting
+        in ``order_ids``. Returns {apotheke order id: order payload}."""
+        result = {}
+        for setting in self.mapped('shop_id.setting_id'):
+            orders = self.filtered(lambda o: o.shop_id.setting_id == setting)
+            if not setting.server or not setting.api_key:
+                raise UserError(_("API configuration missing on Shop %s.") % (orders[0].shop_id.name or _("(unknown)")))
+
+            client = setting._get_api_client()
+            for order_ids in split_every(FETCH_ORDER_IDS_LIMIT, orders.mapped('apotheke_order_id')):
+                # API request config
+                params = {'order_ids': ','.join(order_ids), 'max': FETCH_ORDER_IDS_LIMIT}
+
+                try:
+                    resp = client.get('/api/orders', params=params)
+                except Exception as e:
+                    self.env['bus.bus']._sendone(
+                        self.env.user.partner_id, 'simple_notification', {
+                            'type': 'danger',
+                            'sticky': True,
+                            'message': _("API request failed: %s") % str(e),
+                        })
+                    continue
+
+                if resp.status_code != 200:
+                    self.env['bus.bus']._sendone(
+                        self.env.user.partner_id, 'simple_notification', {
+                            'type': 'danger',
+                            'sticky': True,
+                            'message': _("Error fetching orders %s: %s") % (', '.join(order_ids), resp.text),
+                        })
+                    continue
+
+                for data in resp.json().get('orders') or []:
+                    result[data.get('order_id')] = data
+        return result
+
+    def _apply_apotheke_order_data(self, data):
+        self.ensure_one()
+        Country = self.env['res.country']
 
         # Update billing address
         bill = data['customer']['billing_address']
@@ -191,10 +273,9 @@ class SaleOrder(models.Model):
                 'zip': bill.get('zip_code') or '',
                 'city': bill.get('city') or '',
             }
-            if bill.get('country_iso_code'):
-                country = self.env['res.country'].search([('code', '=', bill['country_iso_code'])], limit=1)
-                if country:
-                    vals_bill['country_id'] = country.id
+            country_id = Country._get_apotheke_country_id(bill.get('country_iso_code'))
+            if country_id:
+                vals_bill['country_id'] = country_id
 
             self.partner_id.write(vals_bill)
             self.partner_invoice_id.write(vals_bill)
@@ -208,10 +289,9 @@ class SaleOrder(models.Model):
                 'zip': ship.get('zip_code') or '',
                 'city': ship.get('city') or '',
             }
-            if ship.get('country_iso_code'):
-                country = self.env['res.country'].search([('code', '=', ship['country_iso_code'])], limit=1)
-                if country:
-                    vals_ship['country_id'] = country.id
+            country_id = Country._get_apotheke_country_id(ship.get('country_iso_code'))
+            if country_id:
+                vals_ship['country_id'] = country_id
 
             self.partner_shipping_id.write(vals_ship)
 
@@ -222,17 +302,14 @@ class SaleOrder(models.Model):
                 'name': "%s %s" % (cust.get('firstname') or '', cust.get('lastname') or ''),
             }
 
-            locale = cust.get('locale')
-            if locale:
-                lang_code = locale.split('_')[0]
-                lang = self.env['res.lang'].search([('code', '=', lang_code)], limit=1)
-                if lang:
-                    partner_vals['lang'] = lang.code
+            lang_code = self.env['res.lang']._get_apotheke_lang_code(cust.get('locale'))
+            if lang_code:
+                partner_vals['lang'] = lang_code
 
             self.partner_id.write(partner_vals)
 
         # Update commitment date
-        latest = data.get('delivery_date', {}).get('latest')
+        latest = (data.get('delivery_date') or {}).get('latest')
         if latest:
             try:
                 dt = datetime.fromisoformat(latest.replace('Z', '+00:00'))
@@ -240,14 +317,6 @@ class SaleOrder(models.Model):
             except Exception:
                 pass  # Do not fail on parse error
 
-        # Final success notification
-        self.env['bus.bus']._sendone(
-            self.env.user.partner_id, 'simple_notification', {
-                'type': 'success',
-                'sticky': False,
-                'message': _("%s: partner information & delivery date updated.") % self.apotheke_order_id,
-            })
-
 
 class SaleOrderLine(models.Model):
     _inherit = 'sale.order.line'
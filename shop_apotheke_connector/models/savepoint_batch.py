@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def run_in_savepoints(cr, items, process):
+    """
+    Run ``process(items)`` in one savepoint. If it fails, run ``process([item])``
+    for every item in a savepoint of its own, so a single bad item only fails
+    itself instead of the whole batch.
+
+    ``process`` must return one result per item it receives, in the same order
+    (e.g. the records of a multi-record create()).
+
+    :return: (done, failed) where done is a list of (item, result) and failed a
+             list of (item, exception)
+    """
+    items = list(items)
+    if not items:
+        return [], []
+    try:
+        with cr.savepoint():
+            return list(zip(items, process(items))), []
+    except Exception as e:
+        _logger.warning("Batch of %s records failed (%s), retrying them one by one", len(items), e)
+
+    done = []
+    failed = []
+    for item in items:
+        try:
+            with cr.savepoint():
+                result = process([item])
+        except Exception as e:
+            failed.append((item, e))
+            continue
+        done.append((item, next(iter(result), None)))
+    return done, failed
@@ -5,6 +5,8 @@ from odoo import models, fields, api
 import logging
 import re
 
+from .apotheke_api_client import ApothekeApiClient
+
 _logger = logging.getLogger(__name__)
 
 
@@ -23,6 +25,21 @@ class ShopApothekeConnectorSetting(models.Model):
         help='If checked, the connector will create a product in Odoo when a matching one is not found.',
         default= True
     )
+    api_rate_limit = fields.Float(
+        string='API Rate Limit (req/s)',
+        help='Maximum number of API requests per second shared by every user, cron and server process of this instance.',
+        default=5.0
+    )
+    order_commit_batch_size = fields.Integer(
+        string='Order Commit Batch Size',
+        help='Number of orders an order worker claims and commits at once.',
+        default=50
+    )
+    api_max_retries = fields.Integer(
+        string='API Max Retries',
+        help='How many times a throttled (HTTP 429) or failed (HTTP 5xx) API call is retried with backoff.',
+        default=5
+    )
 
     @api.depends('server')
     def _compute_display_name(self):
@@ -37,6 +54,11 @@ class ShopApothekeConnectorSetting(models.Model):
             else:
                 rec.display_name = ''
 
+    def _get_api_client(self):
+        """Return the pooled API client used for every call made on behalf of this instance."""
+        self.ensure_one()
+        return ApothekeApiClient.from_setting(self)
+
     @api.model
     def create(self, vals):
         record = super().create(vals)
@@ -2,7 +2,7 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, api, _
-import requests
+from datetime import datetime, timezone
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -48,13 +48,8 @@ class ShopApothekeShop(models.Model):
                 if not setting or not setting.server or not setting.api_key:
                     return
 
-                url = f"{setting.server.rstrip('/')}/api/channels"
-                headers = {
-                    "Authorization": setting.api_key,
-                    "Accept": "application/json"
-                }
                 query = {"shop_id": shop.shop_number}
-                response = requests.get(url, headers=headers, params=query)
+                response = setting._get_api_client().get('/api/channels', params=query)
 
                 if response.status_code != 200:
                     raise Exception(f"HTTP {response.status_code} - {response.text}")
@@ -62,16 +57,21 @@ class ShopApothekeShop(models.Model):
                 data = response.json()
                 channels = data.get("channels", [])
 
-                # Clear existing channels before update
-                shop.channel_ids.unlink()
-
+                # Update channels in place so their order sync cursor survives, drop the ones gone from the API
+                existing = {channel.code: channel for channel in shop.channel_ids}
                 for channel in channels:
-                    shop.channel_ids.create({
+                    vals = {
                         'shop_id': shop.id,
                         'code': channel.get('code'),
                         'description': channel.get('description'),
                         'label': channel.get('label'),
-                    })
+                    }
+                    if channel.get('code') in existing:
+                        existing.pop(channel.get('code')).write(vals)
+                    else:
+                        shop.channel_ids.create(vals)
+                if existing:
+                    self.env['shop.apotheke.shop.channel'].browse([c.id for c in existing.values()]).unlink()
 
                 self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
                     'type': 'success',
@@ -101,13 +101,8 @@ class ShopApothekeShop(models.Model):
                 if not setting or not setting.server or not setting.api_key:
                     raise Exception(_("Missing API credentials for shop '%s'.") % shop.name)
 
-                url = f"{setting.server.rstrip('/')}/api/shipping/types"
-                headers = {
-                    "Authorization": setting.api_key,
-                    "Accept": "application/json"
-                }
                 query = {"shop_id": shop.shop_number}
-                response = requests.get(url, headers=headers, params=query)
+                response = setting._get_api_client().get('/api/shipping/types', params=query)
 
                 if response.status_code != 200:
                     raise Exception(f"HTTP {response.status_code} - {response.text}")
@@ -179,3 +174,97 @@ class ShopApothekeShopChannel(models.Model):
     code = fields.Char(string="Code", required=True)
     description = fields.Char(string="Description")
     label = fields.Char(string="Name")
+    order_sync_date = fields.Datetime(
+        string="Last Order Sync",
+        readonly=True,
+        help="Latest 'last_updated_date' of the orders imported for this channel. "
+             "Only orders updated since then are downloaded by the next import."
+    )
+    order_sync_order_ids = fields.Text(
+        string="Orders Synced at Last Date",
+        readonly=True,
+        help="Comma-separated Apotheke order IDs already queued at the last sync date."
+    )
+
+    def _get_order_sync_ids(self):
+        return set(filter(None, (self.order_sync_order_ids or '').split(',')))
+
+    def _get_order_sync_params(self):
+        """Date filter to send to /api/orders so only the orders changed since the last sync are returned."""
+        self.ensure_one()
+        if not self.order_sync_date:
+            return {}
+        return {'start_update_date': self.order_sync_date.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+    def _filter_synced_orders(self, orders):
+        """Drop the orders already queued at the current sync date (the API date filter is inclusive)."""
+        self.ensure_one()
+        if not self.order_sync_date:
+            return orders
+        known_ids = self._get_order_sync_ids()
+        return [
+            order for order in orders
+            if not (order.get('order_id') in known_ids
+                    and (_parse_order_update_date(order) or self.order_sync_date) <= self.order_sync_date)
+        ]
+
+    def _advance_order_sync(self, orders, failed_orders=()):
+        """
+        Move the sync cursor to the latest update date found in ``orders``. The
+        cursor stops at the earliest update date of ``failed_orders`` without
+        marking them as synced, so the next import downloads them again.
+        """
+        self.ensure_one()
+        failed_ids = {order.get('order_id') for order in failed_orders}
+        failed_dates = [_parse_order_update_date(order) for order in failed_orders]
+        if not all(failed_dates):
+            # A failed order cannot be placed on the cursor, keep it where it is
+            return
+        limit = min(failed_dates, default=None)
+
+        latest = self.order_sync_date
+        known_ids = self._get_order_sync_ids()
+        ids_at_latest = set(known_ids)
+        if limit and latest and limit < latest:
+            # A full import failed on an order behind the cursor, move it back
+            latest = limit
+            ids_at_latest = set()
+        for order in orders:
+            if order.get('order_id') in failed_ids:
+                continue
+            updated = _parse_order_update_date(order)
+            if not updated or (limit and updated > limit):
+                continue
+            if not latest or updated > latest:
+                latest = updated
+                ids_at_latest = set()
+            if updated == latest:
+                ids_at_latest.add(order.get('order_id'))
+        ids_at_latest.discard(None)
+        ids_at_latest -= failed_ids
+        if latest != self.order_sync_date or ids_at_latest != known_ids:
+            self.write({
+                'order_sync_date': latest,
+                'order_sync_order_ids': ','.join(sorted(ids_at_latest)),
+            })
+
+    def action_reset_order_sync(self):
+        self.write({'order_sync_date': False, 'order_sync_order_ids': False})
+
+
+def _parse_order_update_date(order):
+    return _parse_api_datetime(order.get('last_updated_date') or order.get('created_date'))
+
+
+def _parse_api_datetime(value):
+    """Parse an API ISO 8601 date into a naive UTC datetime truncated to the second."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        _logger.warning("Unparsable Apotheke date: %s", value)
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.replace(microsecond=0)
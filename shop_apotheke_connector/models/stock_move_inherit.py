@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+# Developed by Youssef Omri AKA DZEUF
+
+from odoo import models
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    def _action_done(self, cancel_backorder=False):
+        moves = super()._action_done(cancel_backorder=cancel_backorder)
+        # The on-hand quantity changed, let the stock sync cron push it to Shop Apotheke
+        moves.product_id.product_tmpl_id.filtered('apotheke_qty_updated').write({
+            'apotheke_qty_updated': False,
+        })
+        return moves
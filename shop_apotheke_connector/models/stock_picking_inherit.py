@@ -2,7 +2,6 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, _
-import requests
 
 class StockPicking(models.Model):
     _inherit = 'stock.picking'
@@ -34,7 +33,6 @@ class StockPicking(models.Model):
                 continue
 
             order_id = sale_order.apotheke_order_id
-            url = f"{setting.server}/api/orders/{order_id}/tracking"
 
             carrier = None
             channel_code = sale_order.channel_id.code
@@ -59,13 +57,8 @@ class StockPicking(models.Model):
                 "tracking_number": picking.carrier_tracking_ref or ''
             }
 
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"{setting.api_key}"
-            }
-
             try:
-                response = requests.put(url, json=payload, headers=headers)
+                response = setting._get_api_client().put(f"/api/orders/{order_id}/tracking", json=payload)
                 if response.status_code == 204:
                     self.env['bus.bus']._sendone(
                         self.env.user.partner_id, 'simple_notification', {
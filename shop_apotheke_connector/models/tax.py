@@ -3,6 +3,7 @@
 
 from odoo import models, fields, api
 
+
 class ApothekeTax(models.Model):
     _name = 'apotheke.tax'
     _description = 'Shop Apotheke Tax'
@@ -16,8 +17,8 @@ class ApothekeTax(models.Model):
 
     @api.model
     def create(self, vals):
-        # Link with Odoo Tax
-        if vals.get('value') is not None:
+        # Link with Odoo Tax, unless the caller already resolved it
+        if vals.get('value') is not None and not vals.get('tax_id'):
             tax = self.env['account.tax'].search([
                 ('amount', '=', vals['value']),
                 ('type_tax_use', '=', 'sale'),
@@ -27,3 +28,64 @@ class ApothekeTax(models.Model):
                 vals['tax_id'] = tax.id
 
         return super(ApothekeTax, self).create(vals)
+
+    @api.model
+    def _get_tax_lookup(self, company=None):
+        """Return a lookup table of this company's Apotheke taxes, to be kept for the duration of one import."""
+        return ApothekeTaxLookup(self.env, company or self.env.company)
+
+
+class ApothekeTaxLookup(object):
+    """
+    In-memory mapping of (code, value) to apotheke.tax ids and of rates to sale
+    account.tax ids for one company. Both tables are loaded once; missing
+    Apotheke taxes are created on first use and remembered.
+    """
+
+    def __init__(self, env, company):
+        self.env = env
+        self.company_id = company.id
+        self.created_codes = []
+        self._by_code_value = {}
+        self._by_code = {}
+        self._account_tax_by_rate = None
+        for tax in env['apotheke.tax'].search_read([('company_id', '=', self.company_id)],
+                                                   ['code', 'value'], order='id'):
+            self._by_code_value.setdefault((tax['code'], self._rate_key(tax['value'])), tax['id'])
+            self._by_code.setdefault(tax['code'], tax['id'])
+
+    @staticmethod
+    def _rate_key(value):
+        return round(float(value or 0), 4)
+
+    def get_account_tax_id(self, rate):
+        """Return the sale account.tax id matching ``rate``, or False."""
+        if self._account_tax_by_rate is None:
+            self._account_tax_by_rate = {}
+            for tax in self.env['account.tax'].search_read([
+                ('type_tax_use', '=', 'sale'),
+                ('company_id', '=', self.company_id),
+            ], ['amount']):
+                self._account_tax_by_rate.setdefault(self._rate_key(tax['amount']), tax['id'])
+        return self._account_tax_by_rate.get(self._rate_key(rate), False)
+
+    def get(self, code, value, match_value=True):
+        """
+        Return the apotheke.tax id for ``code`` (and ``value`` when ``match_value``),
+        creating the tax if it does not exist yet.
+        """
+        key = (code, self._rate_key(value))
+        tax_id = self._by_code_value.get(key) if match_value else self._by_code.get(code)
+        if tax_id:
+            return tax_id
+
+        tax_id = self.env['apotheke.tax'].create({
+            'code': code,
+            'value': float(value or 0),
+            'company_id': self.company_id,
+            'tax_id': self.get_account_tax_id(value),
+        }).id
+        self.created_codes.append(code)
+        self._by_code_value.setdefault(key, tax_id)
+        self._by_code.setdefault(code, tax_id)
+        return tax_id
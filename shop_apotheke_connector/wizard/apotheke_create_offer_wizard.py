@@ -2,7 +2,6 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, api, _
-import requests
 import time
 from odoo.exceptions import ValidationError
 from datetime import datetime
@@ -69,23 +68,18 @@ class ApothekeCreateOfferWizard(models.TransientModel):
         self.ensure_one()
         if not self.shop_sku:
             raise ValidationError(_("Shop SKU is required. Please generate it or enter manually."))
-        api_key = self.setting_id.api_key
-        server = self.setting_id.server
+        client = self.setting_id._get_api_client()
         sku = self.product_id.sku
 
-        check_url = f"{server}/api/offers"
         check_params = {"product_id": sku, "shop_id": self.shop_id.shop_number}
-        headers = {"Authorization": api_key}
 
         # 1. Check if product exists in Shop Apotheke using EAN
         try:
-            product_check_url = f"{server}/api/products"
             product_check_params = {
                 "product_references": f"EAN|{self.product_id.ean}",
                 "shop_id": self.shop_id.shop_number,
             }
-            headers = {"Authorization": api_key}
-            product_response = requests.get(product_check_url, params=product_check_params, headers=headers)
+            product_response = client.get('/api/products', params=product_check_params)
             product_response.raise_for_status()
             product_data = product_response.json()
 
@@ -99,7 +93,7 @@ class ApothekeCreateOfferWizard(models.TransientModel):
 
         # 2. Check existing offer
         try:
-            check_response = requests.get(check_url, params=check_params, headers=headers)
+            check_response = client.get('/api/offers', params=check_params)
             check_response.raise_for_status()
             offers_data = check_response.json()
         except Exception as e:
@@ -167,9 +161,7 @@ class ApothekeCreateOfferWizard(models.TransientModel):
         post_params = {"shop_id": self.shop_id.shop_number}
 
         try:
-            post_response = requests.post(
-                check_url, json=payload, headers={**headers, "Content-Type": "application/json"}, params=post_params
-            )
+            post_response = client.post('/api/offers', json=payload, params=post_params)
             post_response.raise_for_status()
             self._notify("Offer successfully created!", success=True)
 
@@ -177,13 +169,8 @@ class ApothekeCreateOfferWizard(models.TransientModel):
             # 4. Fetch Offer ID from Shop Apotheke of the newly created Offer
             offer_data = {}
             try:
-                endpoint = f"{server}/api/offers"
-                headers = {
-                    "Authorization": f"{api_key}",
-                    "Content-Type": "application/json",
-                }
                 params = {"shop_sku": self.shop_sku}
-                response = requests.get(endpoint, headers=headers, params=params)
+                response = client.get('/api/offers', params=params)
                 response.raise_for_status()
                 offer_data = response.json()
             except Exception as e:
@@ -2,7 +2,16 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, api, _
-import requests
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from ..models.apotheke_api_client import ApothekeApiError
+from ..models.savepoint_batch import run_in_savepoints
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Number of records created per create() call when queuing orders
+QUEUE_BATCH_SIZE = 200
 
 
 class ImportApothekeOrderWizard(models.TransientModel):
@@ -15,6 +24,11 @@ class ImportApothekeOrderWizard(models.TransientModel):
     channel_id = fields.Many2one('shop.apotheke.shop.channel', string='Channel', required=True,
                                  domain="[('shop_id', '=', shop_id)]")
     change_state_on_apotheke = fields.Boolean(string='Change state on Shop Apotheke', default=False)
+    full_import = fields.Boolean(
+        string='Ignore Last Sync',
+        default=False,
+        help='Download every waiting order of the channel instead of only the ones updated since the last import.'
+    )
 
     @api.onchange('setting_id')
     def _onchange_setting_id(self):
@@ -28,6 +42,35 @@ class ImportApothekeOrderWizard(models.TransientModel):
         if self.channel_id and self.channel_id.shop_id != self.shop_id:
             self.channel_id = False
 
+    def _prepare_order_fetch(self):
+        """Return the (client, params) pair needed to fetch this wizard's orders."""
+        self.ensure_one()
+        params = {
+            'order_state_codes': 'WAITING_ACCEPTANCE',
+            'channel_codes': self.channel_id.code,
+            'shop_id': self.shop_id.shop_number,
+        }
+        if not self.full_import:
+            params.update(self.channel_id._get_order_sync_params())
+        return self.setting_id._get_api_client(), params
+
+    @staticmethod
+    def _fetch_orders(client, params):
+        """
+        Network phase of the import: fetch every page of orders matching ``params``.
+        Does not touch the ORM, so it can run in a worker thread.
+
+        :return: (orders, error) where error is the ApothekeApiError that interrupted
+                 the pagination after some pages were received, or None.
+        """
+        try:
+            return client.fetch_all('/api/orders', 'orders', params=params), None
+        except ApothekeApiError as fetch_error:
+            # Keep the pages fetched before the failure, the rest comes with the next run
+            if not fetch_error.partial:
+                raise
+            return fetch_error.partial, fetch_error
+
     def action_import_orders(self):
         self.ensure_one()
         setting = self.setting_id
@@ -43,280 +86,11 @@ class ImportApothekeOrderWizard(models.TransientModel):
             return
 
         try:
-            url = f"{setting.server}/api/orders"
-            headers = {'Authorization': setting.api_key}
-            max_items = 100
-            offset = 0
-            all_orders = []
-
-            while True:
-                params = {
-                    'order_state_codes': 'WAITING_ACCEPTANCE',
-                    'channel_codes': channel.code,
-                    'shop_id': shop.shop_number,
-                    'max': max_items,
-                    'offset': offset,
-                }
-                response = requests.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                orders_page = data.get('orders', [])
-                if not orders_page:
-                    break
-                all_orders.extend(orders_page)
-                if len(orders_page) < max_items:
-                    break
-                offset += max_items
-
-            if not all_orders:
-                self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-                    'type': 'info',
-                    'sticky': False,
-                    'message': _("No new orders to import."),
-                })
+            all_orders, fetch_error = self._fetch_orders(*self._prepare_order_fetch())
+            queue = self._import_fetched_orders(all_orders, fetch_error)
+            if not queue:
                 return
 
-            queue = self.env['import.order.queue'].create({
-                'setting_id': setting.id,
-                'shop_id': shop.id,
-                'channel_id': channel.id,
-                'change_state_on_apotheke': self.change_state_on_apotheke,
-            })
-            partner_model = self.env['res.partner']
-            queue_line_vals = []
-            for order in all_orders:
-                try:
-                    customer_data = order.get('customer') or {}
-                    partner = self.env['res.partner'].search([
-                        ('apotheke_customer_id', '=', customer_data.get('customer_id'))
-                    ], limit=1)
-
-                    customer_data = order.get('customer') or {}
-                    ap_customer_id = customer_data.get('customer_id')
-                    partner = partner_model.search([('apotheke_customer_id', '=', ap_customer_id)], limit=1)
-
-                    if not partner:
-                        customer_data = order.get('customer') or {}
-
-                        # Compose partner name from firstname + lastname if no organization name
-                        org = customer_data.get('organization') or {}
-                        if org.get('name'):
-                            partner_name = org.get('name')
-                        else:
-                            firstname = customer_data.get('firstname') or ''
-                            lastname = customer_data.get('lastname') or ''
-                            partner_name = (firstname + ' ' + lastname).strip() or 'Apotheke Customer'
-
-                        partner = partner_model.create({
-                            'name': partner_name,
-                            'street': org.get('street'),
-                            'zip': org.get('zip'),
-                            'city': org.get('city'),
-                            'phone': customer_data.get('phone'),
-                            'email': customer_data.get('email'),
-                            'apotheke_customer_id': customer_data.get('customer_id'),
-                            'type': 'contact',
-                            'customer_rank': 1,
-                        })
-
-                    # Create or search invoice partner to avoid duplicates
-                    billing = customer_data.get('billing_address') or {}
-                    invoice_partner = partner_model.search([
-                        ('parent_id', '=', partner.id),
-                        ('type', '=', 'invoice')
-                    ], limit=1)
-                    if not invoice_partner:
-                        invoice_partner = partner_model.create({
-                            'name': ((customer_data.get('firstname', '') + ' ' + customer_data.get('lastname',
-                                                                                                   '')).strip()) or 'Billing Apotheke Customer',
-                            'parent_id': partner.id,
-                            'type': 'invoice',
-                            'street': billing.get('street'),
-                            'zip': billing.get('zip'),
-                            'city': billing.get('city'),
-                            'phone': billing.get('phone'),
-                            'email': billing.get('email'),
-                        })
-
-                    # Create or search shipping partner to avoid duplicates
-                    shipping = customer_data.get('shipping_address') or {}
-                    shipping_partner = partner_model.search([
-                        ('parent_id', '=', partner.id),
-                        ('type', '=', 'delivery')
-                    ], limit=1)
-                    if not shipping_partner:
-                        shipping_partner = partner_model.create({
-                            'name': ((customer_data.get('firstname', '') + ' ' + customer_data.get('lastname',
-                                                                                                   '')).strip()) or 'Billing Apotheke Customer',
-                            'parent_id': partner.id,
-                            'type': 'delivery',
-                            'street': shipping.get('street'),
-                            'zip': shipping.get('zip'),
-                            'city': shipping.get('city'),
-                            'phone': shipping.get('phone'),
-                            'email': shipping.get('email'),
-                        })
-
-                    # Taxes
-                    tax_ids = []
-                    for group in ('order_taxes', 'shipping_taxes', 'commission_taxes'):
-                        for tax in order.get(group) or []:
-                            code = tax.get('code')
-                            rate = float(tax.get('rate', 0))
-                            if code:
-                                ap_tax = self.env['apotheke.tax'].search([
-                                    ('code', '=', code), ('value', '=', rate), ('company_id', '=', self.env.company.id)
-
-                                ], limit=1)
-                                if not ap_tax:
-                                    ap_tax = self.env['apotheke.tax'].create({'code': code, 'value': rate, 'company_id': self.env.company.id})
-                                if ap_tax.id not in tax_ids:
-                                    tax_ids.append(ap_tax.id)
-
-                    line_lines = []
-                    for line in order.get('order_lines', []):
-                        try:
-                            product = self.env['product.product'].search([
-                                ('default_code', '=', line.get('product_sku'))
-                            ], limit=1)
-
-                            if product:
-                                template = product.product_tmpl_id
-                                apotheke_product_obj = self.env['apotheke.product']
-                                apotheke_product = apotheke_product_obj.search([
-                                    ('sku', '=', line.get('product_sku'))
-                                ], limit=1)
-
-                                # Case 1: Apotheke product found
-                                if apotheke_product:
-                                    if not apotheke_product.odoo_product_id:
-                                        apotheke_product.odoo_product_id = template.id
-                                        template.transferred_to_apotheke = True
-                                        apotheke_product.shop_ids = [(4, shop.id)]
-
-                                # Case 2: Not found in apotheke.product
-                                else:
-                                    # Create a new apotheke.product and link to template
-                                    apotheke_product_obj.create({
-                                        'name': product.name or line.get('product_title'),
-                                        'sku': line.get('product_sku'),
-                                        'ean': product.product_tmpl_id.ean,
-                                        'brand': product.product_brand_id.name if hasattr(product,
-                                                                                          'product_brand_id') else '',
-                                        'odoo_product_id': template.id,
-                                        'state_sync_odoo': 'synchronized',
-                                        'setting_id': setting.id,
-                                        'shop_ids': [(4, shop.id)]
-                                    })
-                                    template.transferred_to_apotheke = True
-
-                            else:
-                                # Case 3: Product not found in Odoo, create template and product
-                                product_template = self.env['product.template'].create({
-                                    'name': line.get('product_title') or 'Unnamed Apotheke Product',
-                                    'default_code': line.get('product_sku'),
-                                    'type': 'consu',
-                                    'is_storable': True,
-                                    'transferred_to_apotheke': True,
-                                })
-                                product = product_template.product_variant_id
-
-                                # Then create apotheke.product linked to this new template
-                                self.env['apotheke.product'].create({
-                                    'name': product_template.name,
-                                    'sku': product_template.default_code,
-                                    'ean': product_template.barcode,
-                                    'odoo_product_id': product_template.id,
-                                    'state_sync_odoo': 'synchronized',
-                                    'setting_id': setting.id,
-                                    'shop_ids': [(4, shop.id)]
-                                })
-
-                            # Line-level taxes
-                            line_tax_ids = []
-                            for tax in line.get('taxes', []):
-                                code = tax.get('code')
-                                rate = float(tax.get('rate', 0))
-                                if code:
-                                    ap_tax = self.env['apotheke.tax'].search([
-                                        ('code', '=', code), ('value', '=', rate), ('company_id', '=', self.env.company.id)
-                                    ], limit=1)
-                                    if not ap_tax:
-                                        ap_tax = self.env['apotheke.tax'].create({'code': code, 'value': rate, 'company_id': self.env.company.id})
-                                    if ap_tax.id not in tax_ids:
-                                        tax_ids.append(ap_tax.id)
-                                    if ap_tax.id not in line_tax_ids:
-                                        line_tax_ids.append(ap_tax.id)
-
-                            quantity = float(line.get("quantity", 1))
-                            total_price = float(line.get("price", 0))
-                            tax_amount = sum(t.get("amount", 0) for t in line.get("taxes", []))
-                            subtotal = total_price - tax_amount
-
-                            line_lines.append((0, 0, {
-                                'product_id': product.id if product else False,
-                                'product_uom_qty': quantity,
-                                'price_unit': subtotal/quantity,
-                                'commission': line.get('total_commission', 0),
-                                'name': line.get('product_title'),
-                                'apotheke_line_id': line.get('order_line_id'),
-                                'tax_id': [(6, 0, line_tax_ids)],
-                                'product_sku': line.get('product_sku') or line.get('product_shop_sku'),
-                                'apotheke_state': order.get('order_state'),
-                            }))
-
-                        except Exception as line_error:
-                            self.env['import.order.queue.line.log'].create({
-                                'order_line_queue_id': False,
-                                'message': _("Failed to process line: %s") % str(line_error),
-                                'status': 'error',
-                            })
-
-                    queue_line = self.env['import.order.queue.line'].create({
-                        'queue_id': queue.id,
-                        'apotheke_order_id': order.get('order_id'),
-                        'partner_id': partner.id if partner else False,
-                        'order_reference_for_customer': (order.get('references') or {}).get(
-                            'order_reference_for_customer'),
-                        'apotheke_tax_ids': [(6, 0, tax_ids)],
-                        'order_lines_ids': line_lines,
-                    })
-
-                    # Success log for the order
-                    self.env['import.order.queue.log'].create({
-                        'order_queue_id': queue.id,
-                        'message': _("Order %s processed successfully.") % order.get('order_id'),
-                        'status': 'success',
-                    })
-
-                    # Success log for the order lines
-                    for order_line in queue_line.order_lines_ids:
-                        self.env['import.order.queue.line.log'].create({
-                            'order_line_queue_id': queue_line.id,
-                            'message': _("Line %s successfully added to queue.") % order_line.apotheke_line_id,
-                            'status': 'success',
-                        })
-
-                except Exception as order_error:
-                    # Failure log (line and queue)
-                    self.env['import.order.queue.line.log'].create({
-                        'order_line_queue_id': False,
-                        'message': _("Failed to process order %s: %s") % (order.get('order_id'), str(order_error)),
-                        'status': 'error',
-                    })
-
-                    self.env['import.order.queue.log'].create({
-                        'order_queue_id': queue.id,
-                        'message': _("Error processing order %s: %s") % (order.get('order_id'), str(order_error)),
-                        'status': 'error',
-                    })
-
-            self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-                'type': 'success',
-                'sticky': False,
-                'message': _("Successfully queued %s orders.") % len(all_orders),
-            })
-
             return {
                 'type': 'ir.actions.act_window',
                 'name': _('Order Import Queue'),
@@ -331,3 +105,433 @@ class ImportApothekeOrderWizard(models.TransientModel):
                 'sticky': False,
                 'message': _("Order import failed: %s") % str(e),
             })
+
+    def _filter_known_orders(self, orders):
+        """
+        Drop the orders that already have a sale order or a non-failed queue line,
+        using one lookup per model for the whole batch instead of one per order.
+        Orders returned twice by the pagination are only kept once.
+        """
+        order_ids = list({order.get('order_id') for order in orders if order.get('order_id')})
+        if not order_ids:
+            return orders
+
+        known_ids = set(self.env['sale.order'].sudo().search([
+            ('apotheke_order_id', 'in', order_ids),
+        ]).mapped('apotheke_order_id'))
+        known_ids.update(self.env['import.order.queue.line'].sudo().search([
+            ('apotheke_order_id', 'in', order_ids),
+            ('state', '!=', 'failed'),
+        ]).mapped('apotheke_order_id'))
+
+        new_orders = []
+        for order in orders:
+            order_id = order.get('order_id')
+            if order_id in known_ids:
+                continue
+            if order_id:
+                known_ids.add(order_id)
+            new_orders.append(order)
+        return new_orders
+
+    @staticmethod
+    def _get_customer_key(order):
+        """Key identifying the customer of an API order, falls back to the order for anonymous customers."""
+        customer_data = order.get('customer') or {}
+        return customer_data.get('customer_id') or ('order', order.get('order_id'))
+
+    def _prepare_partner_vals(self, customer_data):
+        # Compose partner name from firstname + lastname if no organization name
+        org = customer_data.get('organization') or {}
+        if org.get('name'):
+            partner_name = org.get('name')
+        else:
+            firstname = customer_data.get('firstname') or ''
+            lastname = customer_data.get('lastname') or ''
+            partner_name = (firstname + ' ' + lastname).strip() or 'Apotheke Customer'
+
+        vals = {
+            'name': partner_name,
+            'street': org.get('street'),
+            'zip': org.get('zip'),
+            'city': org.get('city'),
+            'phone': customer_data.get('phone'),
+            'email': customer_data.get('email'),
+            'apotheke_customer_id': customer_data.get('customer_id'),
+            'type': 'contact',
+            'customer_rank': 1,
+        }
+        lang_code = self.env['res.lang']._get_apotheke_lang_code(customer_data.get('locale'))
+        if lang_code:
+            vals['lang'] = lang_code
+        return vals
+
+    def _prepare_partner_address_vals(self, customer_data, parent_id, address_type):
+        address = customer_data.get('billing_address' if address_type == 'invoice' else 'shipping_address') or {}
+        name = ((customer_data.get('firstname') or '') + ' ' + (customer_data.get('lastname') or '')).strip()
+        return {
+            'name': name or 'Billing Apotheke Customer',
+            'parent_id': parent_id,
+            'type': address_type,
+            'street': address.get('street'),
+            'zip': address.get('zip'),
+            'city': address.get('city'),
+            'country_id': self.env['res.country']._get_apotheke_country_id(address.get('country_iso_code')),
+            'phone': address.get('phone'),
+            'email': address.get('email'),
+        }
+
+    def _create_batch(self, Model, keys, vals_list):
+        """
+        Create one ``Model`` record per entry of ``vals_list`` with a single create()
+        call. If the batch fails, the records are created one by one in savepoints
+        so a single bad record is left out instead of failing the import.
+
+        :return: dict mapping the key of each created record to its id
+        """
+        done, failed = run_in_savepoints(
+            self.env.cr, list(zip(keys, vals_list)),
+            lambda items: Model.create([vals for _key, vals in items]))
+        for (key, _vals), e in failed:
+            _logger.warning("Failed to create %s for %s: %s", Model._name, key, e)
+        return {key: record.id for (key, _vals), record in done}
+
+    def _resolve_partners(self, orders):
+        """
+        Find or create the customer of every order, plus its invoice and delivery
+        addresses, with one lookup per kind of record and batched creates.
+        Customers that could not be created are left out of the result.
+
+        :return: dict mapping _get_customer_key(order) to a res.partner id
+        """
+        Partner = self.env['res.partner']
+        customers = {}
+        for order in orders:
+            customers.setdefault(self._get_customer_key(order), order.get('customer') or {})
+
+        partner_ids = {}
+        customer_ids = [key for key in customers if not isinstance(key, tuple)]
+        if customer_ids:
+            for partner in Partner.search_read([('apotheke_customer_id', 'in', customer_ids)],
+                                               ['apotheke_customer_id'], order='id'):
+                partner_ids.setdefault(partner['apotheke_customer_id'], partner['id'])
+
+        missing = [key for key in customers if key not in partner_ids]
+        if missing:
+            partner_ids.update(self._create_batch(
+                Partner, missing, [self._prepare_partner_vals(customers[key]) for key in missing]))
+
+        # Create the invoice and delivery addresses that do not exist yet
+        existing_addresses = set()
+        if partner_ids:
+            for address in Partner.search_read([
+                ('parent_id', 'in', list(partner_ids.values())),
+                ('type', 'in', ('invoice', 'delivery')),
+            ], ['parent_id', 'type']):
+                existing_addresses.add((address['parent_id'][0], address['type']))
+
+        address_keys = [
+            (key, partner_id, address_type)
+            for key, partner_id in partner_ids.items()
+            for address_type in ('invoice', 'delivery')
+            if (partner_id, address_type) not in existing_addresses
+        ]
+        if address_keys:
+            self._create_batch(Partner, address_keys, [
+                self._prepare_partner_address_vals(customers[key], partner_id, address_type)
+                for key, partner_id, address_type in address_keys
+            ])
+
+        return partner_ids
+
+    def _resolve_products(self, orders):
+        """
+        Find the Odoo product of every SKU ordered in ``orders`` with one lookup on
+        product.product and one on apotheke.product. Missing templates and
+        Apotheke products are created in batch and linked to the wizard's shop.
+        SKUs whose template could not be created are left out of the result.
+
+        :return: dict mapping the product SKU to a product.product id
+        """
+        ProductTemplate = self.env['product.template']
+        ApothekeProduct = self.env['apotheke.product']
+        setting = self.setting_id
+        shop = self.shop_id
+
+        titles = {}
+        for order in orders:
+            for line in order.get('order_lines') or []:
+                if line.get('product_sku'):
+                    titles.setdefault(line['product_sku'], line.get('product_title'))
+        if not titles:
+            return {}
+
+        # sku -> (product.product id, product.template id)
+        variants = {}
+        for product in self.env['product.product'].search_read([('default_code', 'in', list(titles))],
+                                                                ['default_code', 'product_tmpl_id']):
+            variants.setdefault(product['default_code'], (product['id'], product['product_tmpl_id'][0]))
+        apotheke_products = {}
+        for product in ApothekeProduct.search_read([('sku', 'in', list(titles))], ['sku', 'odoo_product_id']):
+            apotheke_products.setdefault(product['sku'], product)
+
+        # Product not found in Odoo, create template and product
+        missing = [sku for sku in titles if sku not in variants]
+        new_template_ids = set()
+        if missing:
+            template_ids = self._create_batch(ProductTemplate, missing, [{
+                'name': titles[sku] or 'Unnamed Apotheke Product',
+                'default_code': sku,
+                'type': 'consu',
+                'is_storable': True,
+                'transferred_to_apotheke': True,
+            } for sku in missing])
+            for template in ProductTemplate.browse(list(template_ids.values())):
+                variants[template.default_code] = (template.product_variant_id.id, template.id)
+                new_template_ids.add(template.id)
+
+        # Link existing Apotheke products, create the missing ones
+        has_brand = 'product_brand_id' in self.env['product.product']._fields
+        existing_products = {product.id: product for product in self.env['product.product'].browse(
+            [variant_id for variant_id, template_id in variants.values() if template_id not in new_template_ids])}
+        transferred_ids = set()
+        apotheke_skus = []
+        apotheke_vals = []
+        for sku, (variant_id, template_id) in variants.items():
+            apotheke_product = apotheke_products.get(sku)
+            if apotheke_product:
+                if not apotheke_product['odoo_product_id']:
+                    ApothekeProduct.browse(apotheke_product['id']).write({
+                        'odoo_product_id': template_id,
+                        'shop_ids': [(4, shop.id)],
+                    })
+                    transferred_ids.add(template_id)
+                continue
+
+            vals = {
+                'name': titles[sku] or 'Unnamed Apotheke Product',
+                'sku': sku,
+                'odoo_product_id': template_id,
+                'state_sync_odoo': 'synchronized',
+                'setting_id': setting.id,
+                'shop_ids': [(4, shop.id)],
+            }
+            if template_id not in new_template_ids:
+                product = existing_products[variant_id]
+                vals.update({
+                    'name': product.name or titles[sku],
+                    'ean': product.product_tmpl_id.ean,
+                    'brand': product.product_brand_id.name if has_brand else '',
+                })
+            apotheke_skus.append(sku)
+            apotheke_vals.append(vals)
+
+        if apotheke_vals:
+            created = self._create_batch(ApothekeProduct, apotheke_skus, apotheke_vals)
+            transferred_ids.update(
+                variants[sku][1] for sku in created if variants[sku][1] not in new_template_ids)
+        transferred_ids -= new_template_ids
+        if transferred_ids:
+            ProductTemplate.browse(list(transferred_ids)).write({'transferred_to_apotheke': True})
+
+        return {sku: variant_id for sku, (variant_id, _template_id) in variants.items()}
+
+    def _create_queue_lines(self, queue, queue_line_vals, queue_log_vals, line_log_vals):
+        """
+        Create the queue lines (with their order lines) and all the logs with
+        multi-record create() calls of QUEUE_BATCH_SIZE records. If a batch of
+        queue lines fails, its records are retried one by one so a single bad
+        order only fails itself.
+
+        :return: the created import.order.queue.line records
+        """
+        QueueLine = self.env['import.order.queue.line'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+
+        created_lines = QueueLine
+        for batch in split_every(QUEUE_BATCH_SIZE, queue_line_vals):
+            done, failed = run_in_savepoints(self.env.cr, batch, QueueLine.create)
+            for vals, order_error in failed:
+                queue_log_vals.append({
+                    'order_queue_id': queue.id,
+                    'message': _("Error processing order %s: %s") % (vals['apotheke_order_id'], str(order_error)),
+                    'status': 'error',
+                })
+            queue_lines = QueueLine.concat(*(record for _vals, record in done))
+
+            created_lines |= queue_lines
+            for queue_line in queue_lines:
+                # Success log for the order
+                queue_log_vals.append({
+                    'order_queue_id': queue.id,
+                    'message': _("Order %s processed successfully.") % queue_line.apotheke_order_id,
+                    'status': 'success',
+                })
+                # Success log for the order lines
+                line_log_vals.extend({
+                    'order_line_queue_id': queue_line.id,
+                    'message': _("Line %s successfully added to queue.") % order_line.apotheke_line_id,
+                    'status': 'success',
+                } for order_line in queue_line.order_lines_ids)
+
+        for batch in split_every(QUEUE_BATCH_SIZE, queue_log_vals):
+            self.env['import.order.queue.log'].create(list(batch))
+        for batch in split_every(QUEUE_BATCH_SIZE, line_log_vals):
+            self.env['import.order.queue.line.log'].create(list(batch))
+        return created_lines
+
+    def _import_fetched_orders(self, all_orders, fetch_error=None):
+        """
+        ORM phase of the import: queue the fetched orders for this wizard's
+        instance, shop and channel.
+
+        :return: the created import.order.queue, or False if there was nothing to queue.
+        """
+        self.ensure_one()
+        setting = self.setting_id
+        shop = self.shop_id
+        channel = self.channel_id
+
+        if fetch_error:
+            _logger.warning("Order fetch for shop %s / channel %s stopped after %s orders: %s",
+                            shop.name, channel.label, len(all_orders), fetch_error)
+            self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
+                'type': 'warning',
+                'sticky': False,
+                'message': _("Order fetch interrupted, queuing the %s orders received: %s")
+                           % (len(all_orders), fetch_error),
+            })
+
+        fetched_orders = all_orders
+        if not self.full_import:
+            all_orders = channel._filter_synced_orders(all_orders)
+        all_orders = self._filter_known_orders(all_orders)
+
+        if not all_orders:
+            # Every fetched order is already known, only move the cursor forward
+            # when every page was received
+            if not fetch_error:
+                channel._advance_order_sync(fetched_orders)
+            self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
+                'type': 'info',
+                'sticky': False,
+                'message': _("No new orders to import."),
+            })
+            return False
+
+        queue = self.env['import.order.queue'].create({
+            'setting_id': setting.id,
+            'shop_id': shop.id,
+            'channel_id': channel.id,
+            'change_state_on_apotheke': self.change_state_on_apotheke,
+        })
+        partner_ids = self._resolve_partners(all_orders)
+        tax_lookup = self.env['apotheke.tax']._get_tax_lookup()
+        product_ids = self._resolve_products(all_orders)
+        QueueLine = self.env['import.order.queue.line']
+        queue_line_vals = []
+        queue_log_vals = []
+        line_log_vals = []
+        for order in all_orders:
+            try:
+                partner_id = partner_ids.get(self._get_customer_key(order))
+                if not partner_id:
+                    raise UserError(_("Missing partner for the order customer."))
+                missing_skus = [line['product_sku'] for line in order.get('order_lines') or []
+                                if line.get('product_sku') and line['product_sku'] not in product_ids]
+                if missing_skus:
+                    raise UserError(_("Missing product for SKU %s.") % ', '.join(missing_skus))
+
+                # Taxes
+                tax_ids = []
+                for group in ('order_taxes', 'shipping_taxes', 'commission_taxes'):
+                    for tax in order.get(group) or []:
+                        code = tax.get('code')
+                        rate = float(tax.get('rate', 0))
+                        if code:
+                            ap_tax_id = tax_lookup.get(code, rate)
+                            if ap_tax_id not in tax_ids:
+                                tax_ids.append(ap_tax_id)
+
+                line_lines = []
+                for line in order.get('order_lines', []):
+                    try:
+                        product_id = product_ids.get(line.get('product_sku'))
+
+                        # Line-level taxes
+                        line_tax_ids = []
+                        for tax in line.get('taxes', []):
+                            code = tax.get('code')
+                            rate = float(tax.get('rate', 0))
+                            if code:
+                                ap_tax_id = tax_lookup.get(code, rate)
+                                if ap_tax_id not in tax_ids:
+                                    tax_ids.append(ap_tax_id)
+                                if ap_tax_id not in line_tax_ids:
+                                    line_tax_ids.append(ap_tax_id)
+
+                        quantity = float(line.get("quantity", 1))
+                        total_price = float(line.get("price", 0))
+                        tax_amount = sum(t.get("amount", 0) for t in line.get("taxes", []))
+                        subtotal = total_price - tax_amount
+
+                        line_lines.append((0, 0, {
+                            'product_id': product_id or False,
+                            'product_uom_qty': quantity,
+                            'price_unit': subtotal/quantity,
+                            'commission': line.get('total_commission', 0),
+                            'name': line.get('product_title'),
+                            'apotheke_line_id': line.get('order_line_id'),
+                            'tax_id': [(6, 0, line_tax_ids)],
+                            'product_sku': line.get('product_sku') or line.get('product_shop_sku'),
+                            'apotheke_state': order.get('order_state'),
+                        }))
+
+                    except Exception as line_error:
+                        line_log_vals.append({
+                            'order_line_queue_id': False,
+                            'message': _("Failed to process line: %s") % str(line_error),
+                            'status': 'error',
+                        })
+
+                queue_line_vals.append({
+                    'queue_id': queue.id,
+                    'apotheke_order_id': order.get('order_id'),
+                    'partner_id': partner_id or False,
+                    'order_reference_for_customer': (order.get('references') or {}).get(
+                        'order_reference_for_customer'),
+                    'apotheke_tax_ids': [(6, 0, tax_ids)],
+                    'order_lines_ids': line_lines,
+                    'raw_order_data': QueueLine._compress_order_data(order),
+                })
+
+            except Exception as order_error:
+                # Failure log (line and queue)
+                line_log_vals.append({
+                    'order_line_queue_id': False,
+                    'message': _("Failed to process order %s: %s") % (order.get('order_id'), str(order_error)),
+                    'status': 'error',
+                })
+                queue_log_vals.append({
+                    'order_queue_id': queue.id,
+                    'message': _("Error processing order %s: %s") % (order.get('order_id'), str(order_error)),
+                    'status': 'error',
+                })
+
+        queue_lines = self._create_queue_lines(queue, queue_line_vals, queue_log_vals, line_log_vals)
+
+        # The cursor never passes an order that could not be queued, so the next
+        # import downloads it again
+        if not fetch_error:
+            queued_ids = set(queue_lines.mapped('apotheke_order_id'))
+            channel._advance_order_sync(fetched_orders, failed_orders=[
+                order for order in all_orders if order.get('order_id') not in queued_ids
+            ])
+
+        self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
+            'type': 'success',
+            'sticky': False,
+            'message': _("Successfully queued %s orders.") % len(all_orders),
+        })
+
+        return queue
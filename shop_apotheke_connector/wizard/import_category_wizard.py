@@ -2,7 +2,6 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, _
-import requests
 
 
 class ImportCategoryWizard(models.TransientModel):
@@ -28,9 +27,8 @@ class ImportCategoryWizard(models.TransientModel):
             })
             return
 
-        url = f"{setting.server}/api/hierarchies"
         try:
-            response = requests.get(url, headers={"Authorization": setting.api_key})
+            response = setting._get_api_client().get('/api/hierarchies')
             response.raise_for_status()
             data = response.json()
 
@@ -2,7 +2,7 @@
 # Developed by Youssef Omri AKA DZEUF
 
 from odoo import models, fields, api, _
-import requests
+from ..models.apotheke_api_client import ApothekeApiError
 
 
 class ImportOfferWizard(models.TransientModel):
@@ -43,37 +43,22 @@ class ImportOfferWizard(models.TransientModel):
             return
 
         try:
-            url = f"{setting.server}/api/offers"
-            headers = {'Authorization': f'{setting.api_key}'}
-
-            max_items = 100  # max per page supported by the API
-            offset = 0
-            all_offers = []
-
-            # Loop to fetch all pages
-            while True:
-                params = {
-                    'shop_id': self.shop_id.shop_number,
-                    'max': max_items,
-                    'offset': offset,
-                }
-                response = requests.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                offers_page = data.get('offers', [])
-
-                if not offers_page:
-                    break  # no more offers
-
-                all_offers.extend(offers_page)
-
-                if len(offers_page) < max_items:
-                    break  # last page
-
-                offset += max_items
+            params = {'shop_id': self.shop_id.shop_number}
+            try:
+                all_offers = setting._get_api_client().fetch_all('/api/offers', 'offers', params=params)
+            except ApothekeApiError as fetch_error:
+                # Keep the pages fetched before the failure instead of dropping them
+                if not fetch_error.partial:
+                    raise
+                all_offers = fetch_error.partial
+                log_model.create({
+                    'queue_id': queue.id,
+                    'message': _("Offer fetch interrupted after %s offers: %s") % (len(all_offers), fetch_error),
+                    'status': 'error',
+                })
 
             channel_model = self.env['shop.apotheke.shop.channel']
-            tax_model = self.env['apotheke.tax']
+            tax_lookup = self.env['apotheke.tax']._get_tax_lookup()
 
             success_count = 0
 
@@ -120,24 +105,15 @@ class ImportOfferWizard(models.TransientModel):
 
                 # === Tax check and create ===
                 additional_fields = offer.get('offer_additional_fields', [])
-                created_tax_codes = []
+                created_count = len(tax_lookup.created_codes)
 
                 for field in additional_fields:
                     code = field.get('code', '')
                     if 'tax' in code.lower():
-                        existing_tax = tax_model.search([('code', '=', code), ('company_id', '=', self.env.company.id)], limit=1)
-                        if not existing_tax:
-                            tax = tax_model.create({
-                                'tax_id': False,
-                                'code': code,
-                                'value': float(field.get('value') or 0),
-                                'company_id': self.env.company.id
-                            })
-                            queue_line.write({'apotheke_tax_id': tax.id})
-                            created_tax_codes.append(code)
-                        else:
-                            queue_line.write({'apotheke_tax_id': existing_tax.id})
+                        tax_id = tax_lookup.get(code, field.get('value'), match_value=False)
+                        queue_line.write({'apotheke_tax_id': tax_id})
 
+                created_tax_codes = tax_lookup.created_codes[created_count:]
                 if created_tax_codes:
                     self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
                         'type': 'success',
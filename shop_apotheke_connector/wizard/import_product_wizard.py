@@ -3,70 +3,142 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools import split_every
 import base64
-import requests
+import csv
+import io
 import logging
+import mmap
+import tempfile
 from openpyxl import load_workbook
-from io import BytesIO
 
 _logger = logging.getLogger(__name__)
 
+# Queue lines created per create() call
+LINE_BATCH_SIZE = 500
+# Size of the base64 slices decoded at once (multiple of 4)
+DECODE_CHUNK_SIZE = 4 * 1024 * 1024
+# The sheet layout uses columns A..K
+ROW_WIDTH = 11
+# Number of header rows before the first product row
+HEADER_ROWS = 2
+
 
 class ImportProductWizard(models.TransientModel):
     _name = 'import.product.wizard'
     _description = 'Import Product Wizard'
 
-    file = fields.Binary('Excel File', required=True)
+    file = fields.Binary('File', required=True, help='Apotheke catalog export as Excel (.xlsx) or CSV file.')
     filename = fields.Char('Filename')
 
+    def _write_file_to(self, tmp):
+        """Decode the uploaded file into ``tmp`` slice by slice, without a second full copy in memory."""
+        data = self.file
+        if isinstance(data, str):
+            data = data.encode()
+        for start in range(0, len(data), DECODE_CHUNK_SIZE):
+            tmp.write(base64.b64decode(data[start:start + DECODE_CHUNK_SIZE]))
+        tmp.flush()
+
+    def _iter_excel_rows(self, tmp):
+        # Memory-mapped and read_only: rows are streamed from the file instead of
+        # building the whole sheet in memory
+        with mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            workbook = load_workbook(filename=buffer, read_only=True, data_only=True)
+            try:
+                sheet = workbook.active  # First sheet
+                yield from sheet.iter_rows(min_row=HEADER_ROWS + 1, values_only=True)
+            finally:
+                workbook.close()
+
+    def _iter_csv_rows(self, tmp):
+        tmp.seek(0)
+        text = io.TextIOWrapper(tmp, encoding='utf-8-sig', newline='')
+        try:
+            sample = text.read(64 * 1024)
+            text.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+            except csv.Error:
+                # Irregular header rows, fall back to the most frequent separator
+                delimiter = max(',;\t', key=sample.count)
+            for index, row in enumerate(csv.reader(text, delimiter=delimiter)):
+                if index >= HEADER_ROWS:
+                    yield [value.strip() or None for value in row]
+        finally:
+            text.detach()
+
+    def _iter_rows(self, tmp):
+        """Yield the product rows of the decoded file ``tmp`` padded to ROW_WIDTH columns."""
+        is_csv = (self.filename or '').lower().endswith('.csv')
+        rows = self._iter_csv_rows(tmp) if is_csv else self._iter_excel_rows(tmp)
+        for row in rows:
+            row = tuple(row)
+            yield row + (None,) * (ROW_WIDTH - len(row))
+
     def action_import_products(self):
         if not self.file:
-            raise UserError(_("Please upload a valid Excel file."))
+            raise UserError(_("Please upload a valid Excel or CSV file."))
 
+        QueueLine = self.env['import.product.queue.line']
         try:
-            file_data = base64.b64decode(self.file)
-            workbook = load_workbook(filename=BytesIO(file_data), data_only=True)
-            sheet = workbook.active  # First sheet
-
             queue = self.env['import.product.queue'].create({})
             row_count = 0
-
-            for row in sheet.iter_rows(min_row=3, values_only=True):  # Start from 3rd row (1-based index)
-                # Skip row if all relevant fields are empty or critical ones (like SKU/Name) are missing
-                if not any([row[0], row[1], row[2], row[3], row[7], row[10]]) or not row[1] or not row[2]:
-                    continue
-
-                category_text = row[0]
-                sku = row[1]
-                name = row[2]
-                ean = row[3]
-                brand = row[7]
-                image_url = row[10]
-
-                category_id = None
-                if category_text:
-                    last_word = category_text.split('/')[-1].strip()
-                    category_id = self.env['apotheke.category'].search([('name', '=ilike', last_word)], limit=1)
-
-                image_data = None
-                if image_url:
-                    try:
-                        img_response = requests.get(image_url, timeout=10)
-                        if img_response.status_code == 200:
-                            image_data = base64.b64encode(img_response.content)
-                    except Exception as e:
-                        _logger.warning("Failed to fetch image for SKU %s: %s", sku, str(e))
-
-                self.env['import.product.queue.line'].create({
-                    'queue_id': queue.id,
-                    'category_id': category_id.id if category_id else False,
-                    'sku': sku,
-                    'name': name,
-                    'ean': ean,
-                    'brand': brand,
-                    'main_image': image_data,
-                })
-                row_count += 1
+            line_ids = []
+            categories = {}
+
+            def _flush(line_vals):
+                line_ids.extend(QueueLine.create(line_vals).ids)
+
+            with tempfile.TemporaryFile() as tmp:
+                self._write_file_to(tmp)
+                line_vals = []
+                for row in self._iter_rows(tmp):
+                    # Skip row if all relevant fields are empty or critical ones (like SKU/Name) are missing
+                    if not any([row[0], row[1], row[2], row[3], row[7], row[10]]) or not row[1] or not row[2]:
+                        continue
+
+                    category_text = row[0]
+                    sku = row[1]
+                    name = row[2]
+                    ean = row[3]
+                    brand = row[7]
+                    image_url = row[10]
+
+                    category_id = False
+                    if category_text:
+                        last_word = str(category_text).split('/')[-1].strip()
+                        if last_word not in categories:
+                            categories[last_word] = self.env['apotheke.category'].search(
+                                [('name', '=ilike', last_word)], limit=1).id
+                        category_id = categories[last_word]
+
+                    line_vals.append({
+                        'queue_id': queue.id,
+                        'category_id': category_id,
+                        'sku': sku,
+                        'name': name,
+                        'ean': ean,
+                        'brand': brand,
+                        'image_url': image_url,
+                    })
+                    row_count += 1
+                    if len(line_vals) >= LINE_BATCH_SIZE:
+                        _flush(line_vals)
+                        line_vals = []
+                if line_vals:
+                    _flush(line_vals)
+
+            # Image stage: download every image concurrently once the lines exist
+            for batch in split_every(LINE_BATCH_SIZE, line_ids, QueueLine.browse):
+                images = self.env['apotheke.image.cache']._fetch_images(batch.mapped('image_url'))
+                for line in batch:
+                    if images.get(line.image_url):
+                        try:
+                            with self.env.cr.savepoint():
+                                line.main_image = images[line.image_url]
+                        except Exception as e:
+                            _logger.warning("Invalid image %s for SKU %s: %s", line.image_url, line.sku, e)
 
             self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
                 'type': 'success',
@@ -76,7 +148,7 @@ class ImportProductWizard(models.TransientModel):
 
             self.env['import.product.queue.log'].create({
                 'queue_id': queue.id,
-                'message': f"Imported {row_count} product lines from Excel.",
+                'message': f"Imported {row_count} product lines from {self.filename or 'file'}.",
                 'status': 'success'
             })
 
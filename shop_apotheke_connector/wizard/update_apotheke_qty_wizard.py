@@ -1,5 +1,4 @@
 from odoo import models, fields, api, _
-import requests
 import logging
 from odoo.exceptions import UserError
 
@@ -47,49 +46,22 @@ class UpdateApothekeQtyWizard(models.TransientModel):
         if not self.offer_id:
             raise UserError(_("No matching offer found."))
 
-        qty_available = self.product_id.qty_available
-        payload = {
-            "offers": [{
-                "product_id": self.product_ean,
-                "product_id_type": "EAN",
-                "quantity": qty_available,
-                "shop_sku": self.offer_id.offer_sku,
-                "state_code": self.offer_id.state_code,
-                "update_delete": "update",
-                "price": self.product_id.list_price,
-            }]
-        }
-        query = {
-            "shop_id": self.shop_id.shop_number
-        }
-
-        server_url = self.shop_id.setting_id.server.rstrip("/") + "/api/offers"
-        api_key = self.shop_id.setting_id.api_key
-
-        if not api_key:
+        setting = self.shop_id.setting_id
+        if not setting.api_key:
             raise UserError(_("API Key is missing in the connector setting."))
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"{api_key}"
-        }
-
-        try:
-            response = requests.post(server_url, json=payload, params=query, headers=headers)
-            response.raise_for_status()
-            self._send_notification('success', _("Quantity update sent successfully."))
+        qty_available = self.product_id.qty_available
+        pushed = self.offer_id._push_offers({
+            self.offer_id.id: {
+                'quantity': qty_available,
+                'price': self.product_id.list_price,
+            },
+        })
+        if pushed:
             self.product_id.apotheke_qty_updated = True
             self.product_id.last_update_datetime = fields.Datetime.now()
-            self.offer_id.quantity = self.product_qty_available
-            self.offer_id.price = self.product_id.list_price
-
-        except Exception as e:
-            _logger.exception("Error updating Apotheke quantity")
-            self._send_notification('danger', _("Failed to update quantity: %s") % str(e))
-
-    def _send_notification(self, notif_type, message):
-        self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
-            'type': notif_type,
-            'sticky': False,
-            'message': message,
-        })
+            # Already sent above, only mirror it locally
+            self.offer_id.with_context(apotheke_sync_origin='inbound').write({
+                'quantity': qty_available,
+                'price': self.product_id.list_price,
+            })